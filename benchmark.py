@@ -0,0 +1,323 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ('json_to_store', 'monthly_returns', 'calculate_var', 'var_panel', 'count_zero_volumes',
+          'plot_distributions', 'crawl')
+
+# Stages that read another stage's output
+REQUIRES = {
+    'monthly_returns': 'json_to_store',
+    'calculate_var': 'monthly_returns',
+    'var_panel': 'monthly_returns',
+    'count_zero_volumes': 'json_to_store',
+    'plot_distributions': 'var_panel',
+}
+
+# Modules each stage uses, imported before the clock starts so a stage's
+# time is its work and not e.g. scipy's half-second import
+STAGE_MODULES = {
+    'json_to_store': ('price_store',),
+    'monthly_returns': ('price_store', 'calculate_monthly_returns'),
+    'calculate_var': ('pandas', 'calculate_var'),
+    'var_panel': ('var_panel',),
+    'count_zero_volumes': ('count_zero_volume',),
+    'plot_distributions': ('pandas', 'plot_distributions', 'render_plots'),
+    'crawl': ('benchmark_crawl', 'synthetic_market'),
+}
+
+# Costs a stage's time includes besides its work, recorded with its results
+STAGE_NOTES = {
+    'plot_distributions': 'includes starting the renderer process pool',
+}
+
+# Last day of every synthetic universe; the crawl stage asks for the same range
+CRAWL_END = date(2025, 7, 6)
+
+
+def peak_rss_mb(who=None):
+    """
+    Peak resident memory in MB (None where unsupported) of the current process,
+    or with resource.RUSAGE_CHILDREN of its largest finished child process
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def universe_range(years):
+    start = date(CRAWL_END.year - years, CRAWL_END.month, CRAWL_END.day)
+    return start.isoformat(), CRAWL_END.isoformat()
+
+
+def _stage_json_to_store(workdir, params):
+    import price_store
+    price_store.convert_json_results(os.path.join(workdir, 'results'), price_store.store_dir)
+    return len(price_store.list_tickers())
+
+
+def _stage_monthly_returns(workdir, params):
+    import price_store
+    from calculate_monthly_returns import calculate_monthly_returns
+    tickers = price_store.list_tickers()
+    os.makedirs('monthly_returns', exist_ok=True)
+    for ticker in tickers:
+        calculate_monthly_returns(ticker).to_csv(f'monthly_returns/monthly_returns_{ticker}.csv')
+    return len(tickers)
+
+
+def _stage_calculate_var(workdir, params):
+    import pandas as pd
+    from pathlib import Path
+    from calculate_var import calculate_var
+
+    # Per-stock calculate_var over every file
+    files = sorted(Path('monthly_returns').glob('monthly_returns_*.csv'))
+    for file_path in files:
+        returns = pd.read_csv(file_path, index_col=0, parse_dates=True)['log_return']
+        calculate_var(returns)
+    return len(files)
+
+
+def _stage_var_panel(workdir, params):
+    from var_panel import load_monthly_returns_panel, panel_var_frame
+
+    # The vectorised panel path, which writes the results the plots read
+    dates, tickers, panel = load_monthly_returns_panel('monthly_returns')
+    os.makedirs('var_results', exist_ok=True)
+    panel_var_frame(tickers, panel).to_csv('var_results/var_results.csv', index=False)
+    return len(tickers)
+
+
+def _stage_count_zero_volumes(workdir, params):
+    from count_zero_volume import count_zero_volumes
+    count_zero_volumes()
+    with open('zero_volume_counts.json', 'r') as f:
+        return len(json.load(f))
+
+
+def _stage_plot_distributions(workdir, params):
+    import pandas as pd
+    from pathlib import Path
+    from plot_distributions import distribution_jobs
+    from render_plots import render_plots
+
+    output_dir = Path('plot')
+    output_dir.mkdir(exist_ok=True)
+    var_df = pd.read_csv('var_results/var_results.csv')
+    summary = render_plots(distribution_jobs(var_df.head(params['plot_limit']), output_dir=output_dir))
+    return len(summary['rendered'])
+
+
+def _stage_crawl(workdir, params):
+    from benchmark_crawl import run_crawl
+    from synthetic_market import synthetic_symbols
+    tickers = synthetic_symbols(params['tickers'])[:params['crawl_limit']]
+    # The universe's own date range, so the rows crawled grow with its years
+    start, end = (datetime.strptime(day, '%Y-%m-%d') for day in params['range'])
+    run_crawl(params['url'], tickers, params['workers'], params['rate'], params['burst'], start, end)
+    return len(tickers)
+
+
+def _run_stage(stage, workdir, params):
+    """
+    Run one stage in the current (fresh) process and measure it. Output of
+    the repo's scripts is swallowed so it does not drown the report.
+    """
+    import importlib
+    import warnings
+    import price_store
+    warnings.simplefilter('ignore')
+    os.chdir(workdir)
+    price_store.store_dir = os.path.join(workdir, 'store')
+    func = globals()[f'_stage_{stage}']
+    for module in STAGE_MODULES.get(stage, ()):
+        importlib.import_module(module)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = func(workdir, params)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'items': items, 'peak_rss_mb': peak_rss_mb(),
+            # Process pools a stage starts (e.g. the plot renderers) do not count towards RUSAGE_SELF
+            'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None}
+
+
+def run_stage_isolated(stage, workdir, params):
+    """
+    Run a stage in its own spawned process, so peak RSS belongs to that stage
+    and no state (imports, caches) leaks between stages
+    """
+    # An executor rather than multiprocessing.Pool: its worker is not
+    # daemonic, so stages can start process pools of their own
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_run_stage, stage, workdir, params).result()
+
+
+def run_size(n_tickers, years, stages, args):
+    """
+    Build a synthetic universe of n_tickers x years and time every stage on it
+    """
+    from mock_fc_server import start_server
+    from synthetic_market import SyntheticMarket, write_results
+
+    start, end = universe_range(years)
+    market = SyntheticMarket(n_tickers, start, end, seed=args.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        rows = write_results(market, os.path.join(workdir, 'results'), indent=None)
+        json_bytes = sum(entry.stat().st_size for entry in os.scandir(os.path.join(workdir, 'results')))
+        server, url = start_server(market_data=market) if 'crawl' in stages else (None, None)
+        params = {'tickers': n_tickers, 'plot_limit': args.plot_limit, 'crawl_limit': args.crawl_limit,
+                  'url': url, 'workers': args.workers, 'rate': args.rate,
+                  'burst': args.burst or args.rate, 'range': (start, end)}
+        try:
+            for stage in stages:
+                measured = run_stage_isolated(stage, workdir, params)
+                # Stages that only touch part of the universe scale their row count
+                stage_rows = rows * measured['items'] / n_tickers if n_tickers else 0
+                result = {
+                    'stage': stage, 'tickers': n_tickers, 'years': years, 'rows': int(stage_rows),
+                    'items': measured['items'], 'seconds': round(measured['seconds'], 4),
+                    'items_per_second': round(measured['items'] / measured['seconds'], 2) if measured['seconds'] else None,
+                    'rows_per_second': round(stage_rows / measured['seconds'], 1) if measured['seconds'] else None,
+                    'peak_rss_mb': round(measured['peak_rss_mb'], 1) if measured['peak_rss_mb'] else None,
+                    'children_peak_rss_mb': (round(measured['children_peak_rss_mb'], 1)
+                                             if measured['children_peak_rss_mb'] else None),
+                }
+                if stage == 'json_to_store':
+                    result['json_mb'] = round(json_bytes / 1e6, 1)
+                if stage in STAGE_NOTES:
+                    result['note'] = STAGE_NOTES[stage]
+                results.append(result)
+                print(f"  {stage:20s} {n_tickers:>6} tickers x {years:>2}y: {result['seconds']:>8.2f}s "
+                      f"{result['items_per_second'] or 0:>10,.1f} items/s  peak RSS {result['peak_rss_mb']} MB"
+                      + (f" (children {result['children_peak_rss_mb']} MB)" if result['children_peak_rss_mb'] else '')
+                      + (f" [{result['note']}]" if 'note' in result else ''))
+        finally:
+            if server is not None:
+                server.shutdown()
+    return results
+
+
+def scaling_curves(results):
+    """
+    Fit seconds ~ rows^k per stage (log-log least squares). k near 1 is linear
+    scaling; k well above 1 flags a stage that degrades with universe size.
+    """
+    curves = {}
+    for stage in sorted({result['stage'] for result in results}):
+        points = sorted((result['rows'], result['seconds']) for result in results
+                        if result['stage'] == stage and result['rows'] > 0 and result['seconds'] > 0)
+        curve = {'points': [{'rows': rows, 'seconds': seconds} for rows, seconds in points]}
+        if len({rows for rows, _ in points}) >= 2:
+            xs = [math.log(rows) for rows, _ in points]
+            ys = [math.log(seconds) for _, seconds in points]
+            x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+            slope = (sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) /
+                     sum((x - x_mean) ** 2 for x in xs))
+            curve['exponent'] = round(slope, 3)
+        curves[stage] = curve
+    return curves
+
+
+def compare(results, baseline_path, threshold=0.2):
+    """
+    Stages that got slower than the baseline run by more than `threshold`
+
+    Returns:
+    list: Regression descriptions (empty when there are none)
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {(r['stage'], r['tickers'], r['years']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['stage'], result['tickers'], result['years']))
+        if before and before['seconds'] > 0 and result['seconds'] > before['seconds'] * (1 + threshold):
+            regressions.append(f"{result['stage']} ({result['tickers']} tickers x {result['years']}y): "
+                               f"{before['seconds']:.2f}s -> {result['seconds']:.2f}s")
+    return regressions
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def parse_size(value):
+    tickers, _, years = value.lower().partition('x')
+    return int(tickers), int(years or 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot stages on synthetic universes of increasing size')
+    parser.add_argument('--sizes', nargs='+', default=['56x3', '112x3', '224x3', '448x3', '112x1', '112x6'],
+                        help='Universe sizes as TICKERSxYEARS')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--plot-limit', type=int, default=10, help='Tickers plotted per size')
+    parser.add_argument('--crawl-limit', type=int, default=500, help='Tickers crawled per size')
+    parser.add_argument('--workers', type=int, default=8, help='Crawl workers')
+    parser.add_argument('--rate', type=float, default=1000.0, help='Crawl limiter rate against the mock')
+    parser.add_argument('--burst', type=float, default=None, help='Crawl limiter burst (default: --rate)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='Earlier results file; exit non-zero on a slowdown beyond --threshold')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Add the stages whose output the selected ones read, in pipeline order
+    selected = set(args.stages)
+    for stage in args.stages:
+        while stage in REQUIRES:
+            stage = REQUIRES[stage]
+            selected.add(stage)
+    stages = [stage for stage in STAGES if stage in selected]
+    results = []
+    for size in args.sizes:
+        n_tickers, years = parse_size(size)
+        print(f"Universe {n_tickers} tickers x {years} years")
+        results.extend(run_size(n_tickers, years, stages, args))
+
+    report = {'meta': run_metadata(), 'results': results, 'scaling': scaling_curves(results)}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("\nScaling exponents (seconds ~ rows^k):")
+    for stage, curve in report['scaling'].items():
+        print(f"  {stage:20s} {curve.get('exponent', 'n/a')}")
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import tempfile
+import time
+
+import crawl
+import price_store
+from constants import tickers
+from mock_fc_server import FaultInjector, start_server
+from rate_limiter import TokenBucket
+
+
+def run_crawl(url, ticker_list, workers, rate, burst, start=None, end=None):
+    """
+    Crawl `ticker_list` against `url` into a throwaway directory, over the
+    crawl's default history or from `start` to `end` (datetimes)
+
+    Returns:
+    float: Wall-clock seconds taken
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        crawl.results_dir = output_dir
+        price_store.store_dir = f'{output_dir}/store'
+        crawl.limiter = TokenBucket(rate, burst)
+        if start is not None:
+            crawl.history_start, crawl.history_end = start, end
+        crawl.init_client(url)
+        start = time.time()
+        crawl.crawl_tickers(ticker_list, workers=workers)
+        return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure crawl speedup against the local mock endpoint')
+    parser.add_argument('--tickers', type=int, default=8, help='Number of tickers from constants.tickers to crawl')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=50.0, help='Requests per second allowed by the limiter')
+    parser.add_argument('--burst', type=float, default=1)
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated server latency per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random server latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests the server fails with HTTP 500')
+    parser.add_argument('--max-rps', type=float, default=None, help='Server-side quota; requests above it get HTTP 429')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Crawl a synthetic universe of --tickers tickers instead of constants.tickers')
+    args = parser.parse_args()
+
+    market_data = None
+    ticker_list = tickers[:args.tickers]
+    if args.synthetic:
+        from synthetic_market import SyntheticMarket
+        market_data = SyntheticMarket(args.tickers)
+        ticker_list = market_data.tickers
+    faults = FaultInjector(args.latency, args.jitter, args.max_rps, args.error_rate, seed=0)
+    server, url = start_server(market_data=market_data, faults=faults)
+    try:
+        sequential = run_crawl(url, ticker_list, 1, args.rate, args.burst)
+        concurrent = run_crawl(url, ticker_list, args.workers, args.rate, args.burst)
+    finally:
+        server.shutdown()
+
+    print(f"\nSequential (1 worker): {sequential:.2f}s")
+    print(f"Concurrent ({args.workers} workers): {concurrent:.2f}s")
+    print(f"Speedup: {sequential / concurrent:.1f}x")
+    print(f"Server: {faults.requests} data requests, {faults.throttled} throttled, {faults.errors} failed")
+
+
+if __name__ == "__main__":
+    main()
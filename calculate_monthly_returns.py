@@ -1,25 +1,10 @@
-import pandas as pd
 import numpy as np
-import json
-import os
 from pathlib import Path
+import price_store
 
-def calculate_monthly_returns(file_path):
-    # Read JSON file
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
-    
-    # Convert TradingDate to datetime
-    df['TradingDate'] = pd.to_datetime(df['TradingDate'], format='%d/%m/%Y')
-    
-    # Convert ClosePriceAdjusted to float
-    df['ClosePriceAdjusted'] = pd.to_numeric(df['ClosePriceAdjusted'])
-    
-    # Sort by date
-    df = df.sort_values('TradingDate')
+def calculate_monthly_returns(stock_code):
+    # Load only the columns we need from the columnar store (already typed and sorted by date)
+    df = price_store.load_ticker(stock_code, ['ClosePriceAdjusted'])
     
     # Calculate daily log returns
     df['log_return'] = np.log(df['ClosePriceAdjusted'] / df['ClosePriceAdjusted'].shift(1))
@@ -30,20 +15,16 @@ def calculate_monthly_returns(file_path):
     return monthly_returns
 
 def main():
-    # Directory containing the JSON files
-    results_dir = Path('results')
-    
     # Create output directory if it doesn't exist
     output_dir = Path('monthly_returns')
     output_dir.mkdir(exist_ok=True)
     
-    # Process each JSON file
-    for file_path in results_dir.glob('stock_price_*.json'):
-        stock_code = file_path.stem.split('_')[-1]
+    # Process each ticker in the price store
+    for stock_code in price_store.list_tickers():
         print(f"Processing {stock_code}...")
         
         try:
-            monthly_returns = calculate_monthly_returns(file_path)
+            monthly_returns = calculate_monthly_returns(stock_code)
             
             # Save to CSV
             output_file = output_dir / f'monthly_returns_{stock_code}.csv'
@@ -1,7 +1,7 @@
-import pandas as pd
 import numpy as np
 from pathlib import Path
 from scipy import stats
+from var_panel import load_monthly_returns_panel, panel_var_frame
 
 def calculate_var(returns, confidence_levels=[0.95, 0.99]):
     """
@@ -34,33 +34,12 @@ def main():
     output_dir = Path('var_results')
     output_dir.mkdir(exist_ok=True)
     
-    # Store all VaR results
-    all_var_results = []
+    # Align every stock's monthly returns into one dates x stocks panel
+    dates, stock_codes, panel = load_monthly_returns_panel(returns_dir)
+    print(f"Calculating VaR for {len(stock_codes)} stocks...")
     
-    # Process each returns file
-    for file_path in returns_dir.glob('monthly_returns_*.csv'):
-        stock_code = file_path.stem.split('_')[-1]
-        print(f"Calculating VaR for {stock_code}...")
-        
-        try:
-            # Read monthly returns
-            returns = pd.read_csv(file_path, index_col=0, parse_dates=True)
-            returns = returns['log_return']  # Get the returns series
-            
-            # Calculate VaR
-            var_results = calculate_var(returns)
-            
-            # Add stock code to results
-            var_results['stock_code'] = stock_code
-            
-            # Add to list of results
-            all_var_results.append(var_results)
-            
-        except Exception as e:
-            print(f"Error processing {stock_code}: {str(e)}")
-    
-    # Convert results to DataFrame
-    var_df = pd.DataFrame(all_var_results)
+    # Calculate VaR for all stocks in one vectorised call
+    var_df = panel_var_frame(stock_codes, panel)
     
     # Save results
     output_file = output_dir / 'var_results.csv'
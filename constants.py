@@ -11,4 +11,12 @@ tickers = [
     "ICT", "YEG", "VNZ", "ADG", "FPT", "CMG", "ITD", "HPT", "POT", "SMT",
     "VTE", "BSR", "TMB", "MVB", "CST", "PVS", "PVD", "PVC", "DHG", "IMP",
     "DHT", "DPH", "TW3", "TNH", "TTD", "BBT"
-]
\ No newline at end of file
+]
+
+# FastConnect request quota, shared by every crawl worker
+requests_per_second = 1.4
+request_burst = 1
+
+# Daily stock price paging, used by the request planner
+stock_price_page_size = 1000
+max_window_days = None
@@ -1,32 +1,15 @@
 import json
-from pathlib import Path
 import pandas as pd
+import price_store
 
 def count_zero_volumes():
-    # Directory containing the stock price JSON files
-    results_dir = Path('results')
-    
     # Dictionary to store results
     zero_volume_counts = {}
     
-    # Process each JSON file
-    for file_path in results_dir.glob('stock_price_*.json'):
-        stock_code = file_path.stem.split('_')[-1]
-        print(f"Processing {stock_code}...")
-        
-        try:
-            # Read JSON file
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Count occurrences of "TotalMatchVol": "0"
-            zero_count = sum(1 for item in data if item.get('TotalMatchVol') == '0')
-            
-            # Store result
-            zero_volume_counts[stock_code] = zero_count
-            
-        except Exception as e:
-            print(f"Error processing {stock_code}: {str(e)}")
+    # Zero-volume days are counted when rows are written to the price store,
+    # so this is a lookup in each ticker's stats.json
+    for stock_code, stats in price_store.ticker_stats().items():
+        zero_volume_counts[stock_code] = stats['zero_volume_days']
     
     # Convert to DataFrame for better visualization
     df = pd.DataFrame(list(zero_volume_counts.items()), columns=['Stock', 'ZeroVolumeCount'])
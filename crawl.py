@@ -1,80 +1,330 @@
+import argparse
 import json
 import os
-from ssi_fc_data import fc_md_client, model
+import types
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ssi_fc_data import model
 import config
 from datetime import datetime, timedelta
 import time
 from constants import *
+from rate_limiter import TokenBucket
+from retry_policy import CircuitBreaker, backoff_delay
+from crawl_journal import CrawlJournal
+from request_planner import plan_windows, is_last_page, planned_requests, legacy_requests
+import price_store
+from stream_sink import NdjsonSink, iter_records
+from pooled_client import PooledMarketDataClient
+from response_cache import CachingMarketDataClient
+from crawl_metrics import CrawlMetrics, ProgressReporter
+from universe import load_universe
 
-client = fc_md_client.MarketDataClient(config)
+results_dir = 'results'
+client = None
+limiter = TokenBucket(requests_per_second, request_burst)
+breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+metrics = CrawlMetrics()
 
-def save_to_json_file(filename, data):
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=4)
+# Full history fetched for a ticker that is not in the store yet
+history_start = datetime(2022, 6, 7)
+history_end = datetime(2025, 6, 7)
 
 
-def md_get_stock_price(ticker):
-    # Check if file already exists
-    filename = f'results/stock_price_{ticker}.json'
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            existing_data = json.load(f)
-            print(f"File {filename} already exists. Total records: {len(existing_data)}")
-        return
+def init_client(url=None, response_cache=False, credential=None):
+    """
+    Create the shared (pooled) MarketDataClient, optionally pointed at another base url
+    (e.g. the local mock server in mock_fc_server.py), logged in with another
+    credential (a dict with consumerID and consumerSecret) and answering
+    repeated requests from the on-disk response cache
+    """
+    global client
+    _config = config
+    if url or credential:
+        _config = types.SimpleNamespace(**{k: v for k, v in vars(config).items() if not k.startswith('_')})
+        _config.url = url or config.url
+        if credential:
+            _config.consumerID = credential['consumerID']
+            _config.consumerSecret = credential['consumerSecret']
+    if response_cache:
+        client = CachingMarketDataClient(_config, limiter=throttle)
+    else:
+        client = PooledMarketDataClient(_config)
+    client.metrics = metrics
+    return client
+
+
+def throttle():
+    """
+    Pause while the API is failing, then wait for the shared rate limiter
+    """
+    metrics.observe_breaker_wait(breaker.wait())
+    metrics.observe_rate_limit_wait(limiter.acquire())
+
+
+def request_page(ticker, start_str, end_str, page_index):
+    """
+    Request one page of daily prices
+
+    Returns:
+    dict: The API response (`data` is None once there are no more rows)
+    """
+    # A caching client throttles only the requests that miss its cache
+    if getattr(client, 'limiter', None) is None:
+        throttle()
+    req = model.daily_stock_price(ticker, start_str, end_str, page_index, stock_price_page_size)
+    try:
+        data = client.daily_stock_price(config, req)
+        status = str(data.get('status', 'success')).lower()
+        if status not in ('success', '200'):
+            raise RuntimeError(f"API error for {ticker} page {page_index}: {data.get('message')}")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    metrics.observe_rows(len(data.get('data') or []))
+
+    print(f"Fetching data for {ticker} from {start_str} to {end_str}, page {page_index}")
+    return data
+
 
-    all_data = []
-    start_date = datetime.strptime('07/06/2022', '%d/%m/%Y')
-    end_date = datetime.strptime('07/06/2025', '%d/%m/%Y')
-    
-    while start_date < end_date:
-        # Calculate chunk end date (30 days from start or final end date, whichever is earlier)
-        chunk_end = min(start_date + timedelta(days=29), end_date)
-        
+def fetch_range(ticker, start_date, end_date, sink, journal=None, before_page=None):
+    """
+    Fetch every daily price row for `ticker` between start_date and end_date (inclusive)
+    and stream each page into `sink` as soon as it arrives.
+    The range is split by the request planner so each window fits in one page,
+    and pages already checkpointed in `journal` are skipped instead of re-requested.
+    `before_page` is called before every page request (crawl_queue renews its
+    lease there, and raises to stop fetching once the lease is lost).
+
+    Returns:
+    int: Rows fetched for the range, including pages checkpointed by an earlier attempt
+    """
+    total_rows = 0
+    for window_start, window_end in plan_windows(start_date, end_date, stock_price_page_size, max_window_days):
         # Convert dates to required string format
-        start_str = start_date.strftime('%d/%m/%Y')
-        end_str = chunk_end.strftime('%d/%m/%Y')
-        
+        start_str = window_start.strftime('%d/%m/%Y')
+        end_str = window_end.strftime('%d/%m/%Y')
+
         page_index = 1
+        fetched = 0
         while True:
-            req = model.daily_stock_price(ticker, start_str, end_str, page_index, 1000)
-            data = client.daily_stock_price(config, req)
-
-            print(f"Fetching data for {ticker} from {start_str} to {end_str}, page {page_index}")
+            row_count = journal.page_rows(start_str, end_str, page_index) if journal else None
+            last = False
+            if row_count is None:
+                if journal and journal.is_complete(start_str, end_str):
+                    break
+                if before_page:
+                    before_page()
+                data = request_page(ticker, start_str, end_str, page_index)
+                rows = data['data'] or []
+                last = is_last_page(rows, fetched, stock_price_page_size, data.get('totalRecord'))
+                # Write to the sink before journaling, so a journaled page is always on disk
+                sink.write_page(rows)
+                if journal:
+                    journal.record_page(start_str, end_str, page_index, len(rows), last=last)
+                if data['data'] is None:
+                    print(f"No more data available for {start_str} to {end_str}, page {page_index}. Stopping.")
+                row_count = len(rows)
 
-            if data['data'] is None:
-                print(f"No more data available for {start_str} to {end_str}, page {page_index}. Stopping.")
+            fetched += row_count
+            if last or row_count == 0:
                 break
-
-            all_data.extend(data['data'])
             page_index += 1
-            time.sleep(0.7)  # Add 700ms delay between API calls
 
-        # Move to next chunk
-        start_date = chunk_end + timedelta(days=1)
-        time.sleep(0.7)  # Add 700ms delay between date chunks
+        # Make the finished chunk durable before moving on
+        sink.sync()
+        total_rows += fetched
+
+    return total_rows
+
+
+def ticker_date_range(last_date=None):
+    """
+    Date range md_get_stock_price needs to fetch
+
+    Parameters:
+    last_date (datetime): Last stored trading date, for an incremental refresh
+
+    Returns:
+    tuple: (start_date, end_date), or None if the stored data is already up to date
+    """
+    if last_date is not None:
+        # Only ask for the days after the last stored trading date
+        start_date = last_date + timedelta(days=1)
+        end_date = datetime.combine(datetime.today().date(), datetime.min.time())
+        if start_date > end_date:
+            return None
+        return start_date, end_date
+    return history_start, history_end
+
 
-    if len(all_data) == 0:
-        print(f"No data found for {ticker} in the specified date range.")
+def stored_last_date(ticker):
+    """
+    Last TradingDate in the price store for `ticker`. A legacy
+    results/stock_price_{ticker}.json file is converted into the store first.
+    """
+    if price_store.last_trading_date(ticker) is None:
+        legacy_file = os.path.join(results_dir, f'stock_price_{ticker}.json')
+        if os.path.exists(legacy_file):
+            with open(legacy_file, 'r') as f:
+                price_store.write_ticker(ticker, json.load(f))
+    return price_store.last_trading_date(ticker)
+
+
+def plan_crawl(ticker_list, incremental=False):
+    """
+    Print and return the number of requests the planner expects for the crawl,
+    next to what the old fixed 29-day chunking would have needed
+    """
+    planned = 0
+    legacy = 0
+    for ticker in ticker_list:
+        last_date = stored_last_date(ticker)
+        if last_date is not None and not incremental:
+            continue
+        date_range = ticker_date_range(last_date)
+        if date_range is None:
+            continue
+        planned += planned_requests(plan_windows(*date_range, stock_price_page_size, max_window_days))
+        legacy += legacy_requests(*date_range)
+    print(f"Planned requests for {len(ticker_list)} tickers: {planned} (fixed 29-day chunks: {legacy})")
+    return planned
+
+
+def md_get_stock_price(ticker, incremental=False):
+    journal = CrawlJournal(os.path.join(results_dir, '.journal', f'{ticker}.jsonl'))
+    last_date = stored_last_date(ticker)
+    if last_date is not None and not incremental and not journal.pending:
+        print(f"{ticker} already in the price store. Last trading date: {last_date.strftime('%d/%m/%Y')}")
+        return
+
+    date_range = ticker_date_range(last_date if incremental else None)
+    if date_range is None:
+        print(f"{ticker} is up to date")
+        return
+    start_date, end_date = date_range
+
+    # Pages are appended to the ticker's NDJSON file as they arrive
+    filename = os.path.join(results_dir, f'stock_price_{ticker}.ndjson')
+    with NdjsonSink(filename) as sink:
+        fetched = fetch_range(ticker, start_date, end_date, sink, journal)
+
+    if fetched == 0:
+        print(f"No new data found for {ticker} in the specified date range.")
     else:
-        print(f"Total records fetched for {ticker}: {len(all_data)}")
-        save_to_json_file(f'results/stock_price_{ticker}.json', all_data)
+        # Stream the NDJSON rows into the columnar store, de-duplicated on TradingDate
+        total = price_store.append_ticker(ticker, iter_records(filename))
+        print(f"Fetched {fetched} records for {ticker}. Total records: {total}")
+    journal.clear()
+    # The rows are in the store now; the next refresh starts a fresh file
+    # instead of re-merging the ticker's whole history
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def fetch_with_retries(ticker, max_attempts=10, incremental=False):
+    print(f"Fetching stock price for {ticker}")
+    start = time.perf_counter()
+    attempt = 1
+    while attempt <= max_attempts:
+        try:
+            md_get_stock_price(ticker, incremental=incremental)
+            metrics.observe_ticker(ticker, time.perf_counter() - start)
+            return True  # Success, exit the retry loop
+        except Exception as e:
+            if attempt == max_attempts:
+                print(f"Failed to fetch data for {ticker} after {max_attempts} attempts. Error: {e}")
+            else:
+                delay = backoff_delay(attempt, base=2)
+                print(f"Attempt {attempt} failed for {ticker}. Retrying in {delay:.1f}s... Error: {e}")
+                metrics.observe_retry(delay)
+                time.sleep(delay)
+            attempt += 1
+    metrics.observe_ticker(ticker, time.perf_counter() - start, ok=False)
+    return False
+
+
+def crawl_tickers(ticker_list, workers=1, incremental=False, progress_interval=0):
+    """
+    Crawl every ticker using a pool of worker threads.
+    All workers share the module-level rate limiter, so the request quota
+    holds no matter how many workers are used.
+    With a progress_interval, a progress line (request rate, ETA) is printed
+    every that many seconds.
+
+    Returns:
+    list: Tickers that still failed after all retries
+    """
+    failed = []
+    progress = ProgressReporter(metrics, len(ticker_list), progress_interval).start() if progress_interval else None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_with_retries, ticker, incremental=incremental): ticker for ticker in ticker_list}
+        for future in as_completed(futures):
+            if not future.result():
+                failed.append(futures[future])
+    if progress is not None:
+        progress.stop()
+    return failed
+
+
+def print_metrics_summary(summary):
+    """
+    Print where the crawl's time went, from CrawlMetrics.summary()
+    """
+    for endpoint, stats in summary['requests'].items():
+        print(f"{endpoint}: {stats['count']} requests, mean {stats['mean'] * 1000:.1f} ms, "
+              f"p90 {stats['p90'] * 1000:.1f} ms, {stats['bytes'] / 1e6:.2f} MB received")
+    print(f"Rows: {summary['rows']} (mean {summary['rows_per_page']['mean'] or 0:.1f} per page), "
+          f"retries: {summary['retries']}")
+    breakdown = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in summary['time_breakdown_seconds'].items())
+    print(f"Time summed over workers: {breakdown}")
 
 
 if __name__ == "__main__":
-    for ticker in tickers:
-        print(f"Fetching stock price for {ticker}")
-        max_attempts = 10
-        attempt = 1
-        while attempt <= max_attempts:
-            try:
-                md_get_stock_price(ticker)
-                break  # Success, exit the retry loop
-            except Exception as e:
-                if attempt == max_attempts:
-                    print(f"Failed to fetch data for {ticker} after {max_attempts} attempts. Error: {e}")
-                else:
-                    print(f"Attempt {attempt} failed for {ticker}. Retrying... Error: {e}")
-                    time.sleep(2)  # Wait 500 milliseconds before retrying
-                attempt += 1
-                
-               
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Crawl daily stock prices from FastConnect')
+    parser.add_argument('--workers', type=int, default=4, help='Number of concurrent crawl workers')
+    parser.add_argument('--rate', type=float, default=requests_per_second, help='Requests per second shared by all workers')
+    parser.add_argument('--burst', type=float, default=request_burst, help='Maximum burst of requests above the rate')
+    parser.add_argument('--url', default=None, help='Override config.url, e.g. a local mock_fc_server.py instance')
+    parser.add_argument('--output-dir', default=results_dir)
+    parser.add_argument('--store-dir', default=price_store.store_dir, help='Columnar price store updated after each ticker')
+    parser.add_argument('--max-window-days', type=int, default=max_window_days,
+                        help='Cap on the calendar days requested in one window')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Fetch only the days after the last stored TradingDate and merge them into the store')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='Serve repeated requests from the on-disk response cache (.response_cache)')
+    parser.add_argument('--metrics-file', default=None,
+                        help='Write crawl metrics here at the end: Prometheus text for *.prom, JSON otherwise')
+    parser.add_argument('--progress', type=float, default=10.0,
+                        help='Seconds between progress lines (0 disables)')
+    parser.add_argument('--universe', action='store_true',
+                        help='Crawl every share listed on HOSE/HNX/UPCOM and in the index_list.json indices')
+    parser.add_argument('--universe-ttl', type=float, default=24 * 3600,
+                        help='Seconds the cached universe (.universe.json) is reused before it is rebuilt')
+    parser.add_argument('tickers', nargs='*', help='Tickers to crawl (default: constants.tickers)')
+    args = parser.parse_args()
+
+    results_dir = args.output_dir
+    price_store.store_dir = args.store_dir
+    price_store.recover_store()
+    os.makedirs(results_dir, exist_ok=True)
+    limiter = TokenBucket(args.rate, args.burst)
+    max_window_days = args.max_window_days
+    init_client(args.url, args.response_cache)
+
+    ticker_list = args.tickers or tickers
+    if args.universe:
+        ticker_list = load_universe(client, limiter, ttl=args.universe_ttl)['symbols']
+        print(f"Universe: {len(ticker_list)} symbols")
+    plan_crawl(ticker_list, incremental=args.incremental)
+    start = time.time()
+    failed = crawl_tickers(ticker_list, workers=args.workers, incremental=args.incremental,
+                           progress_interval=args.progress)
+    print(f"Crawl finished in {time.time() - start:.1f}s")
+    print_metrics_summary(metrics.summary())
+    if args.metrics_file:
+        metrics.write(args.metrics_file)
+        print(f"Metrics written to {args.metrics_file}")
+    if failed:
+        print(f"Failed tickers: {', '.join(failed)}")
@@ -0,0 +1,73 @@
+import json
+import os
+
+
+class CrawlJournal(object):
+    """
+    Append-only checkpoint journal for one ticker's crawl.
+
+    Every page written to the ticker's output sink is recorded as one JSON line
+    keyed by (fromDate, toDate, page), so a retry or a restarted process can
+    resume from the first incomplete page instead of re-requesting the whole
+    range. A page entry with `last` set marks its date chunk as complete.
+
+    The rows themselves live in the output sink. A page is written to the sink
+    before it is journaled, so a crash in between only causes that page to be
+    fetched again; the duplicate rows are dropped when the store is updated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pages = {}
+        self._complete = set()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash: everything before it is still valid
+                    break
+                chunk = (entry['from'], entry['to'])
+                self._pages[chunk + (entry['page'],)] = entry['rows']
+                if entry.get('last'):
+                    self._complete.add(chunk)
+
+    @property
+    def pending(self):
+        """
+        True when a previous run left an unfinished crawl behind
+        """
+        return os.path.exists(self.path)
+
+    def is_complete(self, start_str, end_str):
+        return (start_str, end_str) in self._complete
+
+    def page_rows(self, start_str, end_str, page_index):
+        """
+        Number of rows checkpointed for a page, or None if it was never fetched
+        """
+        return self._pages.get((start_str, end_str, page_index))
+
+    def record_page(self, start_str, end_str, page_index, row_count, last=False):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        entry = {'from': start_str, 'to': end_str, 'page': page_index, 'rows': row_count, 'last': last}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._pages[(start_str, end_str, page_index)] = row_count
+        if last:
+            self._complete.add((start_str, end_str))
+
+    def clear(self):
+        """
+        Drop the journal once the ticker has been saved
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._pages = {}
+        self._complete = set()
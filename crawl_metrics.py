@@ -0,0 +1,245 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets (seconds / rows); +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 60.0)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 750, 1000)
+TICKER_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram, exported with Prometheus semantics (cumulative
+    buckets plus _sum and _count). Not locked itself; CrawlMetrics holds the lock.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Quantile estimated by linear interpolation inside its bucket
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+    def summary(self):
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else None,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99)}
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}' if labels else ''
+
+
+class CrawlMetrics(object):
+    """
+    Thread-safe counters and histograms for one crawl run: request latency,
+    bytes and status per endpoint, rows per page, retries and backoff sleeps,
+    rate limiter and circuit breaker waits, and wall time per ticker
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.latency = {}
+        self.bytes = {}
+        self.statuses = {}
+        self.rows = Histogram(ROWS_BUCKETS)
+        self.total_rows = 0
+        self.rate_limit_wait = Histogram(WAIT_BUCKETS)
+        self.breaker_wait = 0.0
+        self.retries = 0
+        self.backoff_sleep = 0.0
+        self.ticker_time = Histogram(TICKER_BUCKETS)
+        self.tickers = {}
+
+    def observe_request(self, endpoint, seconds, nbytes=0, status=200):
+        with self._lock:
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.bytes[endpoint] = 0
+            self.latency[endpoint].observe(seconds)
+            self.bytes[endpoint] += nbytes
+            key = (endpoint, str(status))
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def observe_rows(self, rows):
+        with self._lock:
+            self.rows.observe(rows)
+            self.total_rows += rows
+
+    def observe_rate_limit_wait(self, seconds):
+        with self._lock:
+            self.rate_limit_wait.observe(seconds)
+
+    def observe_breaker_wait(self, seconds):
+        with self._lock:
+            self.breaker_wait += seconds
+
+    def observe_retry(self, sleep_seconds):
+        with self._lock:
+            self.retries += 1
+            self.backoff_sleep += sleep_seconds
+
+    def observe_ticker(self, ticker, seconds, ok=True):
+        with self._lock:
+            self.ticker_time.observe(seconds)
+            self.tickers[ticker] = {'seconds': round(seconds, 3), 'ok': ok}
+
+    def requests_done(self):
+        with self._lock:
+            return sum(histogram.count for histogram in self.latency.values())
+
+    def summary(self):
+        """
+        JSON-friendly summary, including where the crawl's time went
+        """
+        with self._lock:
+            server_time = sum(histogram.sum for histogram in self.latency.values())
+            return {
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'requests': {endpoint: dict(histogram.summary(), bytes=self.bytes[endpoint])
+                             for endpoint, histogram in self.latency.items()},
+                'statuses': [{'endpoint': endpoint, 'status': status, 'count': count}
+                             for (endpoint, status), count in sorted(self.statuses.items())],
+                'rows_per_page': self.rows.summary(),
+                'rows': self.total_rows,
+                'retries': self.retries,
+                'time_breakdown_seconds': {
+                    # Summed over workers, so these can exceed the elapsed time
+                    'server_latency': round(server_time, 3),
+                    'rate_limit_wait': round(self.rate_limit_wait.sum, 3),
+                    'circuit_breaker_wait': round(self.breaker_wait, 3),
+                    'retry_backoff': round(self.backoff_sleep, 3),
+                },
+                'ticker_seconds': self.ticker_time.summary(),
+                'tickers': dict(self.tickers),
+            }
+
+    def to_prometheus(self):
+        """
+        Metrics in the Prometheus text exposition format (for a textfile collector)
+        """
+        lines = []
+
+        def histogram_lines(name, histogram, **labels):
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum}')
+            lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+
+        with self._lock:
+            lines.append('# TYPE crawl_request_seconds histogram')
+            for endpoint, histogram in sorted(self.latency.items()):
+                histogram_lines('crawl_request_seconds', histogram, endpoint=endpoint)
+            lines.append('# TYPE crawl_response_bytes_total counter')
+            for endpoint, total in sorted(self.bytes.items()):
+                lines.append(f'crawl_response_bytes_total{_labels(endpoint=endpoint)} {total}')
+            lines.append('# TYPE crawl_requests_total counter')
+            for (endpoint, status), count in sorted(self.statuses.items()):
+                lines.append(f'crawl_requests_total{_labels(endpoint=endpoint, status=status)} {count}')
+            lines.append('# TYPE crawl_rows_per_page histogram')
+            histogram_lines('crawl_rows_per_page', self.rows)
+            lines.append('# TYPE crawl_rate_limit_wait_seconds histogram')
+            histogram_lines('crawl_rate_limit_wait_seconds', self.rate_limit_wait)
+            lines.append('# TYPE crawl_circuit_breaker_wait_seconds_total counter')
+            lines.append(f'crawl_circuit_breaker_wait_seconds_total {self.breaker_wait}')
+            lines.append('# TYPE crawl_retries_total counter')
+            lines.append(f'crawl_retries_total {self.retries}')
+            lines.append('# TYPE crawl_retry_backoff_seconds_total counter')
+            lines.append(f'crawl_retry_backoff_seconds_total {self.backoff_sleep}')
+            lines.append('# TYPE crawl_ticker_seconds histogram')
+            histogram_lines('crawl_ticker_seconds', self.ticker_time)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Export to `path`: Prometheus text for *.prom, a JSON summary otherwise
+        """
+        content = self.to_prometheus() if path.endswith('.prom') else json.dumps(self.summary(), indent=2)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h{seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m{seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
+class ProgressReporter(object):
+    """
+    Prints a progress line every `interval` seconds from a background thread:
+    tickers (or other work units, see `label`) done, request rate, rows and
+    the ETA from the completion rate
+    """
+
+    def __init__(self, metrics, total_tickers, interval=5.0, label='tickers'):
+        self.metrics = metrics
+        self.total_tickers = total_tickers
+        self.interval = interval
+        self.label = label
+        self._stop = threading.Event()
+        self._thread = None
+        # The metrics may outlive several crawls, so count from here
+        self._started = time.time()
+        self._tickers_before = len(metrics.tickers)
+        self._requests_before = metrics.requests_done()
+
+    def line(self):
+        elapsed = max(time.time() - self._started, 1e-9)
+        done = len(self.metrics.tickers) - self._tickers_before
+        requests = self.metrics.requests_done() - self._requests_before
+        eta = 'n/a'
+        if done:
+            eta = format_duration((self.total_tickers - done) * elapsed / done)
+        return (f"[progress] {self.label} {done}/{self.total_tickers} | {requests / elapsed:.1f} req/s | "
+                f"{self.metrics.total_rows} rows | elapsed {format_duration(elapsed)} | ETA {eta}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(self.line(), flush=True)
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='crawl-progress', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        print(self.line(), flush=True)
@@ -0,0 +1,495 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+
+import config
+from constants import requests_per_second, request_burst, stock_price_page_size, max_window_days
+from request_planner import plan_windows
+from retry_policy import backoff_delay
+
+queue_file = 'crawl_queue.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    token INTEGER NOT NULL DEFAULT 0,
+    leased_at REAL,
+    lease_expires REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER,
+    error TEXT,
+    UNIQUE (ticker, from_date, to_date)
+);
+CREATE INDEX IF NOT EXISTS units_state ON units (state, available_at);
+CREATE TABLE IF NOT EXISTS tickers (
+    ticker TEXT PRIMARY KEY,
+    merged_at REAL,
+    merge_expires REAL
+);
+'''
+
+
+class Lease(object):
+    """
+    A leased work unit. `token` fences the lease: once the unit is re-queued
+    or stolen, the token changes and the old holder can no longer complete it.
+    """
+
+    __slots__ = ('id', 'ticker', 'from_date', 'to_date', 'token', 'attempts')
+
+    def __init__(self, id, ticker, from_date, to_date, token, attempts):
+        self.id = id
+        self.ticker = ticker
+        self.from_date = from_date
+        self.to_date = to_date
+        self.token = token
+        self.attempts = attempts
+
+
+class LeaseLost(Exception):
+    """
+    Raised inside a unit's fetch once its lease was re-leased or stolen, so
+    the worker stops fetching rows another worker now owns
+    """
+
+
+class CrawlQueue(object):
+    """
+    Persistent (ticker, date window) work queue in a SQLite file
+
+    Any number of worker processes, on this host or on others that mount the
+    same file, lease units from it. A lease runs out after `lease_seconds`
+    unless renewed, and the unit goes back to the queue for someone else.
+    Once nothing is pending, an idle worker steals the unit that has been
+    leased the longest (held over `steal_after` seconds), so one slow worker
+    does not hold up the end of the crawl.
+
+    Unit files are merged into the price store by whichever worker finds a
+    ticker complete, so every worker sharing the queue file must also share
+    the output directory. A unit whose file is missing at merge time is
+    re-queued rather than merged as empty.
+
+    Parameters:
+    path (str): Queue database file
+    lease_seconds (float): Lease length
+    steal_after (float): Minimum age of a lease before it may be stolen (None disables stealing)
+    max_attempts (int): Attempts before a unit is marked failed
+    wal (bool): Use SQLite's WAL journal. Turn it off when the file is shared
+        over a network filesystem, where WAL does not work.
+    """
+
+    def __init__(self, path=None, lease_seconds=120.0, steal_after=60.0, max_attempts=10, wal=True):
+        self.path = path or queue_file
+        self.lease_seconds = lease_seconds
+        self.steal_after = steal_after
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        if wal:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        # Queue files created before merges were leased
+        if 'merge_expires' not in [row[1] for row in self._db.execute('PRAGMA table_info(tickers)')]:
+            self._db.execute('ALTER TABLE tickers ADD COLUMN merge_expires REAL')
+
+    def _transaction(self, func, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never
+        # read the same pending unit and both lease it
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(*args)
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+        return result
+
+    def enqueue(self, units):
+        """
+        Add (ticker, from_date, to_date) units; ones already queued (in any state) are ignored
+
+        Returns:
+        int: Units added
+        """
+        def insert():
+            before = self._db.execute('SELECT COUNT(*) FROM units').fetchone()[0]
+            self._db.executemany('INSERT OR IGNORE INTO units (ticker, from_date, to_date) VALUES (?, ?, ?)',
+                                 units)
+            self._db.executemany('INSERT OR IGNORE INTO tickers (ticker) VALUES (?)',
+                                 sorted({(unit[0],) for unit in units}))
+            # New units make a ticker's store partition stale again
+            self._db.executemany('UPDATE tickers SET merged_at = NULL WHERE ticker = ? AND EXISTS '
+                                 "(SELECT 1 FROM units WHERE units.ticker = tickers.ticker AND state != 'done')",
+                                 sorted({(unit[0],) for unit in units}))
+            return self._db.execute('SELECT COUNT(*) FROM units').fetchone()[0] - before
+        return self._transaction(insert)
+
+    def lease(self, owner):
+        """
+        Lease the next available unit: a pending one, else an expired lease,
+        else (with stealing on) the oldest live lease
+
+        Returns:
+        Lease: The leased unit, or None when there is nothing to do right now
+        """
+        def take():
+            now = time.time()
+            row = self._db.execute(
+                "SELECT id FROM units WHERE (state = 'pending' AND available_at <= ?) "
+                "OR (state = 'leased' AND lease_expires < ?) ORDER BY state DESC, id LIMIT 1", (now, now)).fetchone()
+            if row is None and self.steal_after is not None:
+                row = self._db.execute(
+                    "SELECT id FROM units WHERE state = 'leased' AND owner != ? AND leased_at < ? "
+                    "ORDER BY leased_at LIMIT 1", (owner, now - self.steal_after)).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE units SET state = 'leased', owner = ?, token = token + 1, leased_at = ?, "
+                "lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (owner, now, now + self.lease_seconds, row[0]))
+            return Lease(*self._db.execute('SELECT id, ticker, from_date, to_date, token, attempts FROM units '
+                                           'WHERE id = ?', (row[0],)).fetchone())
+        return self._transaction(take)
+
+    def renew(self, lease):
+        """
+        Extend a lease. Returns False if it was lost (expired and re-leased, or stolen).
+        """
+        cursor = self._db.execute("UPDATE units SET lease_expires = ? WHERE id = ? AND token = ? AND state = 'leased'",
+                                  (time.time() + self.lease_seconds, lease.id, lease.token))
+        return cursor.rowcount == 1
+
+    def complete(self, lease, rows):
+        """
+        Mark a unit done, only if `lease` still holds it
+
+        Returns:
+        bool: True for the one holder whose result counts
+        """
+        cursor = self._db.execute("UPDATE units SET state = 'done', rows = ?, owner = NULL, error = NULL "
+                                  "WHERE id = ? AND token = ? AND state = 'leased'", (rows, lease.id, lease.token))
+        return cursor.rowcount == 1
+
+    def fail(self, lease, error):
+        """
+        Give a unit back after an error: pending again after a backoff delay,
+        or failed once it has used up max_attempts
+        """
+        state = 'failed' if lease.attempts >= self.max_attempts else 'pending'
+        self._db.execute("UPDATE units SET state = ?, owner = NULL, error = ?, available_at = ? "
+                         "WHERE id = ? AND token = ? AND state = 'leased'",
+                         (state, str(error)[:500], time.time() + backoff_delay(lease.attempts, base=2), lease.id,
+                          lease.token))
+
+    def retry_failed(self):
+        self._db.execute("UPDATE units SET state = 'pending', attempts = 0, available_at = 0 WHERE state = 'failed'")
+
+    def remaining(self):
+        return self._db.execute("SELECT COUNT(*) FROM units WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def counts(self):
+        return dict(self._db.execute('SELECT state, COUNT(*) FROM units GROUP BY state').fetchall())
+
+    def claim_merges(self):
+        """
+        Tickers whose units are all done and whose rows are not yet in the
+        price store, each leased to exactly one caller for `lease_seconds`.
+        The caller marks each one merged (or releases it) when done; a claim
+        that is never settled runs out and the ticker is handed out again.
+        """
+        def claim():
+            now = time.time()
+            tickers = [row[0] for row in self._db.execute(
+                "SELECT ticker FROM tickers WHERE merged_at IS NULL AND (merge_expires IS NULL OR merge_expires < ?) "
+                "AND NOT EXISTS (SELECT 1 FROM units WHERE units.ticker = tickers.ticker AND state != 'done')",
+                (now,))]
+            self._db.executemany('UPDATE tickers SET merge_expires = ? WHERE ticker = ?',
+                                 [(now + self.lease_seconds, ticker) for ticker in tickers])
+            return tickers
+        return self._transaction(claim)
+
+    def mark_merged(self, ticker):
+        # Units enqueued while the merge ran keep the ticker unmerged
+        self._db.execute("UPDATE tickers SET merge_expires = NULL, merged_at = CASE WHEN EXISTS "
+                         "(SELECT 1 FROM units WHERE units.ticker = tickers.ticker AND state != 'done') "
+                         'THEN NULL ELSE ? END WHERE ticker = ?', (time.time(), ticker))
+
+    def release_merge(self, ticker):
+        self._db.execute('UPDATE tickers SET merge_expires = NULL WHERE ticker = ?', (ticker,))
+
+    def requeue(self, ticker, from_date, to_date):
+        """
+        Send a done unit back to the queue, e.g. when its file is gone
+        """
+        self._db.execute("UPDATE units SET state = 'pending', owner = NULL, token = token + 1, attempts = 0, "
+                         "available_at = 0, rows = NULL WHERE ticker = ? AND from_date = ? AND to_date = ?",
+                         (ticker, from_date, to_date))
+
+    def unit_ranges(self, ticker):
+        return self._db.execute("SELECT from_date, to_date FROM units WHERE ticker = ? AND state = 'done' "
+                                'ORDER BY from_date', (ticker,)).fetchall()
+
+    def close(self):
+        self._db.close()
+
+
+def plan_units(ticker_list, incremental=False):
+    """
+    (ticker, from_date, to_date) units for the crawl, one per planner window,
+    with dates as 'YYYY-MM-DD'
+    """
+    import crawl
+    units = []
+    for ticker in ticker_list:
+        date_range = crawl.ticker_date_range(crawl.stored_last_date(ticker) if incremental else None)
+        if date_range is None:
+            continue
+        for window_start, window_end in plan_windows(*date_range, stock_price_page_size, max_window_days):
+            units.append((ticker, window_start.date().isoformat(), window_end.date().isoformat()))
+    return units
+
+
+def unit_path(output_dir, ticker, from_date, to_date):
+    return os.path.join(output_dir, 'units', ticker, f'{from_date}_{to_date}.ndjson')
+
+
+def run_unit(lease, output_dir, queue=None):
+    """
+    Fetch one unit into its own file. The file name is fixed per unit and is
+    swapped in whole, so even a worker that lost its lease mid-fetch can only
+    replace it with the same rows.
+
+    With `queue`, the lease is renewed between pages (at most every third of
+    lease_seconds) and LeaseLost is raised once renew reports it lost.
+
+    Returns:
+    int: Rows fetched
+    """
+    import crawl
+    from stream_sink import NdjsonSink
+    path = unit_path(output_dir, lease.ticker, lease.from_date, lease.to_date)
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    start = datetime.strptime(lease.from_date, '%Y-%m-%d')
+    end = datetime.strptime(lease.to_date, '%Y-%m-%d')
+    renewed = [time.time()]
+
+    def renew():
+        # Renewed from this thread, between pages: the queue's connection is not shared across threads
+        if time.time() - renewed[0] < queue.lease_seconds / 3:
+            return
+        if not queue.renew(lease):
+            raise LeaseLost(f"{lease.ticker} {lease.from_date}..{lease.to_date} was leased by another worker")
+        renewed[0] = time.time()
+
+    try:
+        with NdjsonSink(tmp) as sink:
+            rows = crawl.fetch_range(lease.ticker, start, end, sink, before_page=renew if queue else None)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
+
+
+def merge_completed(queue, output_dir):
+    """
+    Move the rows of every fully crawled ticker from its unit files into the
+    price store. A ticker is marked merged only once its rows are stored; if
+    the merge fails its claim is released for the next merge. Units whose
+    file is missing (an output directory not shared with the worker that
+    fetched them, or a deleted file) are re-queued instead.
+
+    Returns:
+    int: Tickers merged
+    """
+    import price_store
+    from stream_sink import iter_records
+    merged = 0
+    for ticker in queue.claim_merges():
+        ranges = queue.unit_ranges(ticker)
+        missing = [(from_date, to_date) for from_date, to_date in ranges
+                   if not os.path.exists(unit_path(output_dir, ticker, from_date, to_date))]
+        if missing:
+            for from_date, to_date in missing:
+                queue.requeue(ticker, from_date, to_date)
+            queue.release_merge(ticker)
+            print(f"Re-queued {len(missing)} units of {ticker}: unit files missing from {output_dir}")
+            continue
+
+        def records():
+            for from_date, to_date in ranges:
+                path = unit_path(output_dir, ticker, from_date, to_date)
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"Unit file {path} disappeared during the merge")
+                yield from iter_records(path)
+        try:
+            total = price_store.append_ticker(ticker, records())
+        except Exception as e:
+            queue.release_merge(ticker)
+            print(f"Failed to merge {ticker} into the price store, will retry: {e}")
+            continue
+        queue.mark_merged(ticker)
+        # Temp files of workers killed mid-unit
+        directory = os.path.join(output_dir, 'units', ticker)
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(directory, name))
+        print(f"Merged {ticker} into the price store: {total} rows")
+        merged += 1
+    return merged
+
+
+def worker(queue_path, credential=None, url=None, rate=requests_per_second, burst=request_burst,
+           output_dir='results', store_dir=None, name=None, lease_seconds=120.0, steal_after=60.0, wal=True):
+    """
+    Lease and run units until the queue is drained. Each worker logs in with
+    its own credential and paces itself with its own rate limiter, since the
+    API quota is per credential.
+
+    Returns:
+    dict: Units completed, units lost to another worker, rows fetched
+    """
+    import contextlib
+    import io
+    import crawl
+    import price_store
+    from rate_limiter import TokenBucket
+
+    if store_dir:
+        price_store.store_dir = store_dir
+    price_store.recover_store()
+    owner = name or f'{socket.gethostname()}:{os.getpid()}'
+    crawl.limiter = TokenBucket(rate, burst)
+    crawl.init_client(url, credential=credential)
+    queue = CrawlQueue(queue_path, lease_seconds, steal_after, wal=wal)
+    stats = {'owner': owner, 'completed': 0, 'lost': 0, 'rows': 0}
+    while True:
+        lease = queue.lease(owner)
+        if lease is None:
+            if queue.remaining() == 0:
+                break
+            # Everything left is leased by live workers or backing off
+            time.sleep(1.0)
+            continue
+        os.makedirs(os.path.dirname(unit_path(output_dir, lease.ticker, lease.from_date, lease.to_date)),
+                    exist_ok=True)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows = run_unit(lease, output_dir, queue)
+        except LeaseLost as e:
+            print(f"[{owner}] {e}; stopped fetching")
+            stats['lost'] += 1
+            continue
+        except Exception as e:
+            print(f"[{owner}] {lease.ticker} {lease.from_date}..{lease.to_date} failed: {e}")
+            queue.fail(lease, e)
+            continue
+        if queue.complete(lease, rows):
+            stats['completed'] += 1
+            stats['rows'] += rows
+        else:
+            stats['lost'] += 1
+    merge_completed(queue, output_dir)
+    queue.close()
+    return stats
+
+
+def load_credentials(path=None):
+    """
+    Credentials to crawl with: a JSON list of {"consumerID", "consumerSecret"}
+    objects, or the single one in config.py
+    """
+    if path is None:
+        return [{'consumerID': config.consumerID, 'consumerSecret': config.consumerSecret}]
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def run_workers(queue_path, credentials, **kwargs):
+    """
+    One worker process per credential on this host
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(len(credentials)) as pool:
+        results = [pool.apply_async(worker, (queue_path, credential), dict(kwargs, name=f'{socket.gethostname()}:{i}'))
+                   for i, credential in enumerate(credentials)]
+        return [result.get() for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl daily prices through a shared, persistent work queue')
+    parser.add_argument('command', choices=('enqueue', 'run', 'work', 'status', 'merge', 'retry-failed'))
+    parser.add_argument('tickers', nargs='*', help='Tickers to enqueue (default: constants.tickers)')
+    parser.add_argument('--queue', default=queue_file, help='Queue database, shared by every worker')
+    parser.add_argument('--credentials', default=None,
+                        help='JSON list of {"consumerID", "consumerSecret"} (default: config.py)')
+    parser.add_argument('--credential-index', type=int, default=0, help='Credential used by `work`')
+    parser.add_argument('--rate', type=float, default=requests_per_second, help='Requests per second per credential')
+    parser.add_argument('--burst', type=float, default=request_burst)
+    parser.add_argument('--url', default=None, help='Override config.url, e.g. a local mock_fc_server.py instance')
+    parser.add_argument('--output-dir', default='results',
+                        help='Unit files; must be shared by every worker that shares the queue')
+    parser.add_argument('--store-dir', default=None)
+    parser.add_argument('--lease', type=float, default=120.0, help='Lease length in seconds')
+    parser.add_argument('--steal-after', type=float, default=60.0,
+                        help='Age in seconds after which an idle worker may steal a live lease (negative disables)')
+    parser.add_argument('--no-wal', action='store_true', help='Rollback journal instead of WAL, for network filesystems')
+    parser.add_argument('--incremental', action='store_true', help='Enqueue only the days after the last stored date')
+    parser.add_argument('--universe', action='store_true', help='Enqueue the whole market (see universe.py)')
+    args = parser.parse_intermixed_args()
+
+    steal_after = args.steal_after if args.steal_after >= 0 else None
+    queue = CrawlQueue(args.queue, args.lease, steal_after, wal=not args.no_wal)
+    if args.store_dir:
+        import price_store
+        price_store.store_dir = args.store_dir
+
+    if args.command == 'enqueue':
+        import crawl
+        from constants import tickers
+        ticker_list = args.tickers or tickers
+        if args.universe:
+            from rate_limiter import TokenBucket
+            from universe import load_universe
+            ticker_list = load_universe(crawl.init_client(args.url), TokenBucket(args.rate, args.burst))['symbols']
+        units = plan_units(ticker_list, args.incremental)
+        added = queue.enqueue(units)
+        print(f"Planned {len(units)} units for {len(ticker_list)} tickers, {added} new; queue: {queue.counts()}")
+    elif args.command == 'status':
+        print(queue.counts())
+    elif args.command == 'merge':
+        print(f"Merged {merge_completed(queue, args.output_dir)} tickers")
+    elif args.command == 'retry-failed':
+        queue.retry_failed()
+        print(queue.counts())
+    else:
+        worker_args = dict(url=args.url, rate=args.rate, burst=args.burst, output_dir=args.output_dir,
+                           store_dir=args.store_dir, lease_seconds=args.lease, steal_after=steal_after,
+                           wal=not args.no_wal)
+        credentials = load_credentials(args.credentials)
+        start = time.time()
+        if args.command == 'work':
+            results = [worker(args.queue, credentials[args.credential_index], **worker_args)]
+        else:
+            results = run_workers(args.queue, credentials, **worker_args)
+        elapsed = time.time() - start
+        for stats in results:
+            print(f"{stats['owner']}: {stats['completed']} units, {stats['rows']} rows, {stats['lost']} lost leases")
+        completed = sum(stats['completed'] for stats in results)
+        print(f"{completed} units in {elapsed:.1f}s ({completed / elapsed:.1f} units/s); queue: {queue.counts()}")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import time
+
+import numpy as np
+
+# Bits of the per-row quality mask
+DUPLICATE_DATE = 1 << 0       # Another row has (or, before de-duplication, had) the same TradingDate
+GAP_BEFORE = 1 << 1           # More weekdays missing before this row than a holiday break explains
+NON_POSITIVE_PRICE = 1 << 2   # An OHLC or adjusted price is zero, negative or missing
+LIMIT_VIOLATION = 1 << 3      # High above CeilingPrice or Low below FloorPrice
+OHLC_INCONSISTENT = 1 << 4    # High below Open/Close/Low, or Low above Open/Close
+ADJUSTED_JUMP = 1 << 5        # ClosePriceAdjusted moved more than any exchange limit allows
+NEGATIVE_VOLUME = 1 << 6      # TotalMatchVol below zero
+
+FLAGS = {
+    'duplicate_date': DUPLICATE_DATE,
+    'gap_before': GAP_BEFORE,
+    'non_positive_price': NON_POSITIVE_PRICE,
+    'limit_violation': LIMIT_VIOLATION,
+    'ohlc_inconsistent': OHLC_INCONSISTENT,
+    'adjusted_jump': ADJUSTED_JUMP,
+    'negative_volume': NEGATIVE_VOLUME,
+}
+
+PRICE_COLUMNS = ('OpenPrice', 'HighestPrice', 'LowestPrice', 'ClosePrice', 'ClosePriceAdjusted')
+
+# Tet can close the market for a full week
+max_missing_weekdays = 5
+
+# Log move of ClosePriceAdjusted above the widest daily limit (UPCOM, 15%)
+max_adjusted_move = np.log(1.2)
+
+
+def check_columns(columns):
+    """
+    Run every check over one ticker's columns (sorted by TradingDate) in one
+    vectorised pass
+
+    Parameters:
+    columns (dict): Column name -> array, as price_store.records_to_columns returns
+
+    Returns:
+    ndarray: uint8 bitmask per row (see FLAGS)
+    """
+    days = np.asarray(columns['TradingDate'], dtype=np.int64)
+    n = len(days)
+    flags = np.zeros(n, dtype=np.uint8)
+    if n == 0:
+        return flags
+
+    same_as_previous = np.zeros(n, dtype=bool)
+    same_as_previous[1:] = days[1:] == days[:-1]
+    duplicate = same_as_previous.copy()
+    duplicate[:-1] |= same_as_previous[1:]
+    flags[duplicate] |= DUPLICATE_DATE
+
+    # Weekdays strictly between each row and the one before it
+    dates = days.astype('datetime64[D]')
+    missing = np.zeros(n, dtype=np.int64)
+    missing[1:] = np.maximum(np.busday_count(dates[:-1], dates[1:]) - 1, 0)
+    gap = missing > max_missing_weekdays
+    flags[gap] |= GAP_BEFORE
+
+    prices = {name: np.asarray(columns[name], dtype=np.float64) for name in PRICE_COLUMNS}
+    non_positive = np.zeros(n, dtype=bool)
+    for values in prices.values():
+        non_positive |= ~(values > 0)
+    flags[non_positive] |= NON_POSITIVE_PRICE
+
+    high, low = prices['HighestPrice'], prices['LowestPrice']
+    open_, close = prices['OpenPrice'], prices['ClosePrice']
+    ceiling = np.asarray(columns['CeilingPrice'], dtype=np.float64)
+    floor = np.asarray(columns['FloorPrice'], dtype=np.float64)
+    # Rows without published limits (0 or missing) are not checked against them
+    has_limits = (ceiling > 0) & (floor > 0)
+    with np.errstate(invalid='ignore'):
+        violation = has_limits & ~non_positive & ((high > ceiling) | (low < floor))
+        inconsistent = ~non_positive & ((high < np.maximum(open_, close)) | (low > np.minimum(open_, close)) |
+                                        (high < low))
+    flags[violation] |= LIMIT_VIOLATION
+    flags[inconsistent] |= OHLC_INCONSISTENT
+
+    adjusted = np.where(prices['ClosePriceAdjusted'] > 0, prices['ClosePriceAdjusted'], np.nan)
+    jump = np.zeros(n, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        jump[1:] = np.abs(np.diff(np.log(adjusted))) > max_adjusted_move
+    # Limits do not apply on the first day after a halt or listing gap
+    jump &= ~gap & ~same_as_previous
+    flags[jump] |= ADJUSTED_JUMP
+
+    flags[np.asarray(columns['TotalMatchVol']) < 0] |= NEGATIVE_VOLUME
+    return flags
+
+
+def summarize(flags):
+    """
+    Per-ticker report: rows flagged by each check, and in total
+
+    Returns:
+    dict: Check name -> row count, plus 'flagged_rows'
+    """
+    flags = np.asarray(flags, dtype=np.uint8)
+    report = {name: int(np.count_nonzero(flags & bit)) for name, bit in FLAGS.items()}
+    report['flagged_rows'] = int(np.count_nonzero(flags))
+    return report
+
+
+def describe(mask):
+    """
+    Names of the checks set in one row's mask
+    """
+    return [name for name, bit in FLAGS.items() if mask & bit]
+
+
+def quality_report(tickers=None, root=None, recheck=False):
+    """
+    Quality report of the tickers in the price store, from the reports kept at
+    ingest (rechecked for partitions written before they were kept, or for
+    every ticker with `recheck`)
+
+    Returns:
+    DataFrame: One row per ticker, one column per check
+    """
+    import pandas as pd
+    import price_store
+    reports = {}
+    for ticker in tickers or price_store.list_tickers(root):
+        report = None if recheck else price_store.load_stats(ticker, root).get('quality')
+        if report is None:
+            report = summarize(check_columns(price_store.load_columns(ticker, root=root)))
+        reports[ticker] = report
+    report = pd.DataFrame.from_dict(reports, orient='index').fillna(0).astype(int)
+    report.index.name = 'stock_code'
+    return report.sort_values('flagged_rows', ascending=False)
+
+
+def write_quality_report(output='data_quality_report.csv', tickers=None, root=None, recheck=False):
+    """
+    Save the quality report to `output` and print the tickers with flagged rows
+    """
+    start = time.perf_counter()
+    report = quality_report(tickers, root, recheck)
+    elapsed = time.perf_counter() - start
+    report.to_csv(output)
+    print(report[report['flagged_rows'] > 0].to_string())
+    print(f"\n{len(report)} tickers checked in {elapsed * 1000:.0f} ms "
+          f"({elapsed * 1000 / max(len(report), 1):.2f} ms per ticker); report saved to {output}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Data quality report of the price store')
+    parser.add_argument('--store-dir', default=None)
+    parser.add_argument('--recheck', action='store_true', help='Rerun the checks instead of reading the ingest reports')
+    parser.add_argument('--output', default='data_quality_report.csv')
+    parser.add_argument('tickers', nargs='*')
+    args = parser.parse_args()
+    write_quality_report(args.output, args.tickers, args.store_dir, args.recheck)
+
+
+if __name__ == "__main__":
+    main()
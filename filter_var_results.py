@@ -1,19 +1,23 @@
 import pandas as pd
-import json
+import price_store
 
-# Read the zero volume stocks
-with open('zero_volume_counts.json', 'r') as f:
-    zero_volume_stocks = json.load(f)
+def main():
+    # Per-ticker statistics kept by the price store (zero volume days, turnover, ...)
+    stats = price_store.ticker_stats()
 
-# Read the VAR results
-var_df = pd.read_csv('historical_var_95_results.csv')
+    # Read the VAR results
+    var_df = pd.read_csv('historical_var_95_results.csv')
 
-# Filter out stocks that are in zero_volume_stocks
-filtered_df = var_df[~var_df['stock_code'].isin(zero_volume_stocks.keys())]
+    # Filter out stocks with more than 100 zero volume days
+    illiquid_stocks = [stock for stock, ticker in stats.items() if ticker['zero_volume_days'] > 100]
+    filtered_df = var_df[~var_df['stock_code'].isin(illiquid_stocks)]
 
-# Save the filtered results
-filtered_df.to_csv('filtered_historical_var_95_results.csv', index=False)
+    # Save the filtered results
+    filtered_df.to_csv('filtered_historical_var_95_results.csv', index=False)
 
-print(f"Original number of stocks: {len(var_df)}")
-print(f"Number of stocks after filtering: {len(filtered_df)}")
-print(f"Number of stocks removed: {len(var_df) - len(filtered_df)}") 
\ No newline at end of file
+    print(f"Original number of stocks: {len(var_df)}")
+    print(f"Number of stocks after filtering: {len(filtered_df)}")
+    print(f"Number of stocks removed: {len(var_df) - len(filtered_df)}") 
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
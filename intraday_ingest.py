@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from ssi_fc_data import model
+
+import config
+import crawl
+from constants import tickers, requests_per_second, request_burst
+from crawl_metrics import ProgressReporter
+from rate_limiter import TokenBucket
+from response_cache import market_today
+from retry_policy import backoff_delay
+
+intraday_dir = 'intraday'
+
+# Rows per IntradayOhlc page; a trading day has about 240 one-minute bars
+intraday_page_size = 1000
+
+PRICE_FIELDS = ('Open', 'High', 'Low', 'Close', 'Value')
+
+
+def partition_path(day, symbol, root=None):
+    """
+    File holding one symbol's bars for one trading day:
+    `intraday/date=YYYY-MM-DD/SYMBOL.ndjson`
+    """
+    return os.path.join(root or intraday_dir, f'date={day.isoformat()}', f'{symbol.upper()}.ndjson')
+
+
+def weekdays(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def is_ingested(day, symbol, root=None):
+    return os.path.exists(partition_path(day, symbol, root))
+
+
+def write_partition(day, symbol, rows, root=None):
+    """
+    Write one (day, symbol) file in one go through a temp file, so a file that
+    exists is always complete. Days without bars (holidays, halts) get an empty
+    file, which marks them as done for the next run.
+    """
+    path = partition_path(day, symbol, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, separators=(',', ':')) + '\n')
+    os.replace(tmp, path)
+
+
+def plan_units(symbols, start, end, window_days=5, root=None, today=None):
+    """
+    Work units (window_start, window_end, symbol) still missing from storage.
+    Windows are the outer loop, so each date partition fills up for the whole
+    universe early in the run instead of one symbol's history at a time.
+    Today is left out: its bars are not final until the close.
+    """
+    if window_days < 1:
+        raise ValueError(f"window_days must be at least 1, got {window_days}")
+    today = today or market_today()
+    end = min(end, today - timedelta(days=1))
+    units = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + timedelta(days=window_days - 1), end)
+        days = list(weekdays(window_start, window_end))
+        if days:
+            for symbol in symbols:
+                if not all(is_ingested(day, symbol, root) for day in days):
+                    units.append((window_start, window_end, symbol))
+        window_start = window_end + timedelta(days=1)
+    return units
+
+
+def request_intraday_page(symbol, start_str, end_str, page_index, page_size=None):
+    """
+    Request one page of one-minute bars under the crawler's shared rate
+    limiter and circuit breaker, recording the crawl metrics
+    """
+    crawl.metrics.observe_breaker_wait(crawl.breaker.wait())
+    crawl.metrics.observe_rate_limit_wait(crawl.limiter.acquire())
+    req = model.intraday_ohlc(symbol, start_str, end_str, page_index, page_size or intraday_page_size, True, 1)
+    try:
+        data = crawl.client.intraday_ohlc(config, req)
+        status = str(data.get('status', 'success')).lower()
+        if status not in ('success', '200'):
+            raise RuntimeError(f"API error for {symbol} intraday page {page_index}: {data.get('message')}")
+    except Exception:
+        crawl.breaker.record_failure()
+        raise
+    crawl.breaker.record_success()
+    crawl.metrics.observe_rows(len(data.get('data') or []))
+    return data
+
+
+def fetch_window(symbol, window_start, window_end):
+    """
+    Every bar of `symbol` in the window, across as many pages as it takes
+    """
+    start_str = window_start.strftime('%d/%m/%Y')
+    end_str = window_end.strftime('%d/%m/%Y')
+    rows = []
+    page_index = 1
+    while True:
+        data = request_intraday_page(symbol, start_str, end_str, page_index)
+        page = data.get('data') or []
+        rows.extend(page)
+        total = data.get('totalRecord')
+        if len(page) < intraday_page_size or (total is not None and len(rows) >= int(total)):
+            return rows
+        page_index += 1
+
+
+def ingest_unit(symbol, window_start, window_end, root=None, max_attempts=5):
+    """
+    Fetch one (symbol, window) unit and write a partition per trading day
+
+    Returns:
+    int: Bars written, or None if every attempt failed
+    """
+    start = time.perf_counter()
+    for attempt in range(1, max_attempts + 1):
+        try:
+            rows = fetch_window(symbol, window_start, window_end)
+            break
+        except Exception as e:
+            if attempt == max_attempts:
+                print(f"Failed intraday {symbol} {window_start} - {window_end} after {max_attempts} attempts. Error: {e}")
+                crawl.metrics.observe_ticker(f'{symbol}:{window_start.isoformat()}', time.perf_counter() - start, ok=False)
+                return None
+            delay = backoff_delay(attempt, base=2)
+            crawl.metrics.observe_retry(delay)
+            time.sleep(delay)
+
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[datetime.strptime(row['TradingDate'], '%d/%m/%Y').date()].append(row)
+    for day in weekdays(window_start, window_end):
+        write_partition(day, symbol, by_day.get(day, []), root)
+    crawl.metrics.observe_ticker(f'{symbol}:{window_start.isoformat()}', time.perf_counter() - start)
+    return len(rows)
+
+
+def ingest(symbols, start, end, workers=4, window_days=5, root=None, progress_interval=0):
+    """
+    Ingest one-minute bars for every symbol and trading day between start and
+    end, skipping (day, symbol) partitions already on disk
+
+    Only a bounded number of units is in flight, so a universe-wide, multi-year
+    plan does not turn into millions of queued futures.
+
+    Returns:
+    dict: units planned, bars written and failed units
+    """
+    units = plan_units(symbols, start, end, window_days, root)
+    print(f"Intraday units to fetch: {len(units)} ({len(symbols)} symbols, {window_days}-day windows)")
+    progress = ProgressReporter(crawl.metrics, len(units), progress_interval, label='units').start() \
+        if progress_interval else None
+    bars = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        queue = iter(units)
+        while True:
+            for window_start, window_end, symbol in queue:
+                future = executor.submit(ingest_unit, symbol, window_start, window_end, root)
+                pending[future] = (symbol, window_start)
+                if len(pending) >= workers * 4:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = pending.pop(future)
+                written = future.result()
+                if written is None:
+                    failed.append(unit)
+                else:
+                    bars += written
+    if progress is not None:
+        progress.stop()
+    return {'units': len(units), 'bars': bars, 'failed': failed}
+
+
+def _to_frame(rows):
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return frame
+    frame['Time'] = pd.to_datetime(frame['TradingDate'] + ' ' + frame['Time'], format='%d/%m/%Y %H:%M:%S')
+    for field in PRICE_FIELDS:
+        frame[field] = frame[field].astype(np.float64)
+    frame['Volume'] = frame['Volume'].astype(np.int64)
+    return frame.drop(columns=['TradingDate'])
+
+
+def _read_partition(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_day(day, symbols=None, root=None):
+    """
+    One trading day's cross-section, reading only that date's partition
+
+    Returns:
+    DataFrame: Bars of every (or the given) symbol, with a datetime `Time` column
+    """
+    directory = os.path.dirname(partition_path(day, 'x', root))
+    if not os.path.isdir(directory):
+        return _to_frame([])
+    names = [f'{symbol.upper()}.ndjson' for symbol in symbols] if symbols else sorted(
+        name for name in os.listdir(directory) if name.endswith('.ndjson'))
+    rows = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            rows.extend(_read_partition(path))
+    return _to_frame(rows)
+
+
+def load_symbol(symbol, start, end, root=None):
+    """
+    One symbol's bars between two dates, opening just its file in each date partition
+    """
+    rows = []
+    for day in weekdays(start, end):
+        path = partition_path(day, symbol, root)
+        if os.path.exists(path):
+            rows.extend(_read_partition(path))
+    return _to_frame(rows)
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-ingest one-minute IntradayOhlc bars into date/symbol partitions')
+    parser.add_argument('--start', type=parse_day, required=True, help='First day, YYYY-MM-DD')
+    parser.add_argument('--end', type=parse_day, default=None, help='Last day, YYYY-MM-DD (default: yesterday)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=requests_per_second, help='Requests per second shared by all workers')
+    parser.add_argument('--burst', type=float, default=request_burst)
+    parser.add_argument('--window-days', type=positive_int, default=5, help='Calendar days fetched per request window')
+    parser.add_argument('--url', default=None, help='Override config.url, e.g. a local mock_fc_server.py instance')
+    parser.add_argument('--output-dir', default=intraday_dir)
+    parser.add_argument('--progress', type=float, default=10.0, help='Seconds between progress lines (0 disables)')
+    parser.add_argument('--metrics-file', default=None, help='Prometheus text (*.prom) or JSON metrics written at the end')
+    parser.add_argument('symbols', nargs='*', help='Symbols to ingest (default: constants.tickers)')
+    args = parser.parse_args()
+
+    crawl.limiter = TokenBucket(args.rate, args.burst)
+    crawl.init_client(args.url)
+    end = args.end or market_today() - timedelta(days=1)
+    started = time.time()
+    result = ingest(args.symbols or tickers, args.start, end, workers=args.workers,
+                    window_days=args.window_days, root=args.output_dir, progress_interval=args.progress)
+    print(f"Ingested {result['bars']} bars for {result['units']} units in {time.time() - started:.1f}s")
+    if result['failed']:
+        print(f"Failed units: {', '.join(f'{symbol}@{day}' for symbol, day in result['failed'])}")
+    if args.metrics_file:
+        crawl.metrics.write(args.metrics_file)
+        print(f"Metrics written to {args.metrics_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from ssi_fc_data.model import api
+
+from rate_limiter import TokenBucket
+
+
+def make_access_token(lifetime=8 * 3600):
+    """
+    Build a JWT-shaped token that MarketDataClient can decode (it only reads `exp`)
+    """
+    def encode(obj):
+        return base64.b64encode(json.dumps(obj).encode('utf-8')).decode('ascii').rstrip('=')
+
+    header = encode({'alg': 'none', 'typ': 'JWT'})
+    payload = encode({'exp': int(time.time()) + lifetime})
+    return f'{header}.{payload}.mock'
+
+
+class MockMarketData(object):
+    """
+    In-memory copy of the daily stock price data served by the mock endpoint.
+    Rows are read lazily from the crawled `results/stock_price_{ticker}.json` files.
+
+    Implements the same data interface as synthetic_market.SyntheticMarket;
+    DailyOhlc is derived from the stock price rows and there are no intraday bars.
+    """
+
+    def __init__(self, data_dir='results'):
+        self.data_dir = data_dir
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def _symbol_rows(self, symbol):
+        symbol = symbol.upper()
+        with self._lock:
+            if symbol not in self._rows:
+                rows = []
+                file_path = os.path.join(self.data_dir, f'stock_price_{symbol}.json')
+                if os.path.exists(file_path):
+                    with open(file_path, 'r') as f:
+                        rows = json.load(f)
+                for row in rows:
+                    row['_date'] = datetime.strptime(row['TradingDate'], '%d/%m/%Y').date()
+                # The live API returns the newest trading day first
+                rows.sort(key=lambda row: row['_date'], reverse=True)
+                self._rows[symbol] = rows
+            return self._rows[symbol]
+
+    def daily_stock_price(self, symbol, from_date, to_date):
+        return [{k: v for k, v in row.items() if k != '_date'}
+                for row in self._symbol_rows(symbol) if from_date <= row['_date'] <= to_date]
+
+    def daily_ohlc(self, symbol, from_date, to_date):
+        return [{'Symbol': row['Symbol'], 'Market': 'HOSE', 'TradingDate': row['TradingDate'], 'Time': None,
+                 'Open': row['OpenPrice'], 'High': row['HighestPrice'], 'Low': row['LowestPrice'],
+                 'Close': row['ClosePrice'], 'Volume': row['TotalMatchVol'], 'Value': row['TotalMatchVal']}
+                for row in reversed(self._symbol_rows(symbol)) if from_date <= row['_date'] <= to_date]
+
+    def intraday_ohlc(self, symbol, from_date, to_date):
+        return []
+
+    def index_components(self, index_code):
+        return []
+
+    def securities(self, market=''):
+        symbols = sorted(name[len('stock_price_'):-len('.json')] for name in os.listdir(self.data_dir)
+                         if name.startswith('stock_price_') and name.endswith('.json'))
+        if market and market.upper() != 'HOSE':
+            return []
+        return [{'Market': 'HOSE', 'Symbol': symbol, 'StockName': symbol, 'StockEnName': symbol}
+                for symbol in symbols]
+
+
+class FaultInjector(object):
+    """
+    Server-side misbehaviour for load and fault tests
+
+    Parameters:
+    latency (float): Seconds added to every data request
+    jitter (float): Extra uniformly random latency, up to this many seconds
+    max_rps (float): Server-side quota; requests above it get HTTP 429
+    error_rate (float): Share of data requests answered with HTTP 500
+    seed (int): Seed for the jitter and error draws
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, max_rps=None, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = TokenBucket(max_rps, max(1.0, max_rps)) if max_rps else None
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def before_request(self):
+        """
+        Sleep for the configured latency, then return (HTTP status, body) for an
+        injected failure, or None to serve the request normally
+        """
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if self.quota is not None and not self.quota.try_acquire():
+            with self._lock:
+                self.throttled += 1
+            return 429, {'status': 429, 'message': 'Too many requests', 'data': None}
+        if fail:
+            with self._lock:
+                self.errors += 1
+            return 500, {'status': 500, 'message': 'Internal server error', 'data': None}
+        return None
+
+
+def paginate(rows, page_index, page_size):
+    """
+    Slice one page out of `rows` using the API's 1-based page index.
+    Returns None past the last page, like the live API does.
+    """
+    start = (page_index - 1) * page_size
+    page = rows[start:start + page_size]
+    return page or None
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%d/%m/%Y').date()
+
+
+def make_handler(market_data, latency=0.0, faults=None):
+    faults = faults or FaultInjector(latency)
+
+    class MockFastConnectHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so pooled clients can reuse their connections
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; without this, delayed ACKs
+        # add ~40 ms to every response on a reused connection
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, body, status=200):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            if len(payload) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                payload = gzip.compress(payload, compresslevel=5)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            path = urlparse(self.path).path.lstrip('/')
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+            if path == api.MD_ACCESS_TOKEN:
+                self._send_json({'status': 200, 'message': 'Success',
+                                 'data': {'accessToken': make_access_token()}})
+            else:
+                self._send_json({'status': 404, 'message': 'Not found', 'data': None}, 404)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            path = parsed.path.lstrip('/')
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            if path not in (api.MD_DAILY_STOCK_PRICE, api.MD_DAILY_OHLC, api.MD_INTRADAY_OHLC, api.MD_SECURITIES,
+                            api.MD_INDEX_COMPONENTS):
+                self._send_json({'status': 404, 'message': 'Not found', 'data': None}, 404)
+                return
+
+            failure = faults.before_request()
+            if failure is not None:
+                self._send_json(failure[1], failure[0])
+                return
+
+            page_index = int(params.get('pageIndex', 1))
+            page_size = int(params.get('pageSize', 10))
+            symbol = params.get('symbol', '')
+            if path == api.MD_SECURITIES:
+                rows = market_data.securities(params.get('market', ''))
+            elif path == api.MD_INDEX_COMPONENTS:
+                # Pages slice the members of the (single) index row
+                indices = market_data.index_components(params.get('indexCode', ''))
+                members = indices[0]['IndexComponent'] if indices else []
+                page = paginate(members, page_index, page_size)
+                data = [dict(indices[0], IndexComponent=page)] if indices and page else None
+                self._send_json({'message': 'Success', 'status': 'Success',
+                                 'totalRecord': len(members), 'data': data})
+                return
+            else:
+                try:
+                    from_date, to_date = parse_date(params['fromDate']), parse_date(params['toDate'])
+                except (KeyError, ValueError):
+                    self._send_json({'status': 400, 'message': 'Invalid fromDate/toDate', 'data': None}, 400)
+                    return
+                if path == api.MD_DAILY_STOCK_PRICE:
+                    rows = market_data.daily_stock_price(symbol, from_date, to_date)
+                else:
+                    if path == api.MD_DAILY_OHLC and (to_date - from_date).days > 30:
+                        self._send_json({'status': 400, 'message': 'Max range 30 days', 'data': None}, 400)
+                        return
+                    fetch = market_data.daily_ohlc if path == api.MD_DAILY_OHLC else market_data.intraday_ohlc
+                    rows = fetch(symbol, from_date, to_date)
+                    if params.get('ascending', 'true').lower() == 'false':
+                        rows = rows[::-1]
+
+            self._send_json({'message': 'Success', 'status': 'Success',
+                             'totalRecord': len(rows), 'data': paginate(rows, page_index, page_size)})
+
+    return MockFastConnectHandler
+
+
+def start_server(host='127.0.0.1', port=0, data_dir='results', latency=0.0, market_data=None, faults=None):
+    """
+    Start the mock server on a background thread
+
+    Parameters:
+    market_data: Data backend, e.g. synthetic_market.SyntheticMarket (default:
+        MockMarketData over the json files in `data_dir`)
+    faults (FaultInjector): Latency, throttling and errors to inject (default: `latency` only)
+
+    Returns:
+    tuple: (server, base url usable as config.url)
+    """
+    handler = make_handler(market_data or MockMarketData(data_dir), latency, faults)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{server.server_address[0]}:{server.server_address[1]}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the FastConnect market data API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--data-dir', default='results', help='Directory with stock_price_*.json files to serve')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Serve a synthetic universe of this many tickers instead of --data-dir')
+    parser.add_argument('--start', default='2022-07-06', help='First day of the synthetic data (YYYY-MM-DD)')
+    parser.add_argument('--end', default='2025-07-06', help='Last day of the synthetic data (YYYY-MM-DD)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of simulated server latency per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency, up to this many seconds')
+    parser.add_argument('--max-rps', type=float, default=None, help='Answer HTTP 429 above this request rate')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with HTTP 500')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from synthetic_market import SyntheticMarket
+        market_data = SyntheticMarket(args.synthetic, args.start, args.end, args.seed)
+    else:
+        market_data = MockMarketData(args.data_dir)
+    faults = FaultInjector(args.latency, args.jitter, args.max_rps, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(market_data, faults=faults))
+    print(f"Mock FastConnect server listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {faults.requests} data requests ({faults.throttled} throttled, {faults.errors} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import price_store
+
+cache_file = '.pipeline_cache.json'
+
+
+class Stage(object):
+    """
+    One step of the analysis pipeline
+
+    Parameters:
+    name (str): Unique stage name
+    func (callable): Top-level function run in a worker process
+    args (tuple): Arguments passed to func
+    inputs (list): Files whose content decides whether the stage must rerun
+    outputs (list): Files the stage writes (a missing output forces a rerun)
+    deps (list): Names of stages that must finish first
+    code (list): Source files of the stage, hashed like inputs so code changes rerun it
+    """
+
+    def __init__(self, name, func, args=(), inputs=(), outputs=(), deps=(), code=()):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.code = list(code)
+
+
+class ContentHasher(object):
+    """
+    SHA-256 of file contents, remembered across runs by (size, mtime) so an
+    unchanged file is not re-read
+    """
+
+    def __init__(self, known=None):
+        self.known = known or {}
+
+    def file_hash(self, path):
+        path = str(path)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        entry = self.known.get(path)
+        if entry and entry[0] == key:
+            return entry[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = [key, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def fingerprint(self, stage):
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        for path in sorted(map(str, stage.code + stage.inputs)):
+            digest.update(path.encode('utf-8'))
+            digest.update(str(self.file_hash(path)).encode('utf-8'))
+        return digest.hexdigest()
+
+
+def _run_quietly(func, args):
+    # Keep the scripts' per-ticker prints out of the pipeline's own log
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+
+
+def monthly_returns_stage(stock_code):
+    from calculate_monthly_returns import calculate_monthly_returns
+    output_dir = Path('monthly_returns')
+    output_dir.mkdir(exist_ok=True)
+    calculate_monthly_returns(stock_code).to_csv(output_dir / f'monthly_returns_{stock_code}.csv')
+
+
+def script_stage(module_name, function_name='main', quiet=True):
+    import importlib
+    module = importlib.import_module(module_name)
+    if quiet:
+        _run_quietly(getattr(module, function_name), ())
+    else:
+        getattr(module, function_name)()
+
+
+def build_stages(tickers=None):
+    """
+    Declare the analysis pipeline as a dependency graph:
+
+    monthly_returns:<ticker> -> var -> extract_historical_var -> filter_var_results
+                                 +--> plot_distributions                 |
+    store stats.json -------------------------------------------^        |
+                                         analyze_var_distribution <------+
+                                         list_var_bins <-----------------+
+    zero_volume, data_quality (reports from the same stats)
+
+    Only the monthly_returns stages are limited to `tickers`: the scripts
+    downstream read every ticker in the store and every monthly returns file,
+    so their inputs cover all of those.
+    """
+    all_tickers = price_store.list_tickers()
+    tickers = [ticker.upper() for ticker in tickers] if tickers else all_tickers
+    store = Path(price_store.store_dir)
+    stages = []
+    all_stats = [store / ticker / 'stats.json' for ticker in sorted(set(all_tickers) | set(tickers))]
+
+    monthly_outputs = []
+    for ticker in tickers:
+        output = f'monthly_returns/monthly_returns_{ticker}.csv'
+        monthly_outputs.append(output)
+        stages.append(Stage(
+            f'monthly_returns:{ticker}', monthly_returns_stage, (ticker,),
+            inputs=[store / ticker / 'TradingDate.npy', store / ticker / 'ClosePriceAdjusted.npy'],
+            outputs=[output],
+            code=['calculate_monthly_returns.py', 'price_store.py'],
+        ))
+    # calculate_var and plot_distributions glob the directory, so files of
+    # tickers outside this run count too
+    existing = {path.as_posix() for path in Path('monthly_returns').glob('monthly_returns_*.csv')}
+    returns_files = sorted(set(monthly_outputs) | existing)
+
+    stages.append(Stage(
+        'zero_volume', script_stage, ('count_zero_volume', 'count_zero_volumes'),
+        inputs=all_stats,
+        outputs=['zero_volume_counts.json'],
+        code=['count_zero_volume.py', 'price_store.py'],
+    ))
+    stages.append(Stage(
+        'data_quality', script_stage, ('data_quality', 'write_quality_report'),
+        inputs=all_stats,
+        outputs=['data_quality_report.csv'],
+        code=['data_quality.py', 'price_store.py'],
+    ))
+    stages.append(Stage(
+        'var', script_stage, ('calculate_var',),
+        inputs=returns_files,
+        outputs=['var_results/var_results.csv'],
+        deps=[f'monthly_returns:{ticker}' for ticker in tickers],
+        code=['calculate_var.py'],
+    ))
+    stages.append(Stage(
+        # Redraws only the charts whose returns or VaR changed (hash sidecars next to each PNG)
+        'plot_distributions', script_stage, ('plot_distributions',),
+        inputs=returns_files + ['var_results/var_results.csv'],
+        deps=['var'],
+        code=['plot_distributions.py', 'render_plots.py'],
+    ))
+    stages.append(Stage(
+        'extract_historical_var', script_stage, ('extract_historical_var',),
+        inputs=['var_results/var_results.csv'],
+        outputs=['historical_var_95_results.csv'],
+        deps=['var'],
+        code=['extract_historical_var.py'],
+    ))
+    stages.append(Stage(
+        'filter_var_results', script_stage, ('filter_var_results',),
+        inputs=['historical_var_95_results.csv'] + all_stats,
+        outputs=['filtered_historical_var_95_results.csv'],
+        deps=['extract_historical_var'],
+        code=['filter_var_results.py', 'price_store.py'],
+    ))
+    stages.append(Stage(
+        'analyze_var_distribution', script_stage, ('analyze_var_distribution',),
+        inputs=['filtered_historical_var_95_results.csv'],
+        outputs=['var_analysis/var_distribution.png'],
+        deps=['filter_var_results'],
+        code=['analyze_var_distribution.py'],
+    ))
+    stages.append(Stage(
+        'list_var_bins', script_stage, ('list_var_bins', 'main', False),
+        inputs=['filtered_historical_var_95_results.csv'],
+        deps=['filter_var_results'],
+        code=['list_var_bins.py'],
+    ))
+    return stages
+
+
+def load_cache(path=None):
+    path = path or cache_file
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_cache(cache, path=None):
+    path = path or cache_file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def run_pipeline(stages, workers=None, force=False):
+    """
+    Run every stage whose inputs changed since its last successful run.
+    Stages run in a process pool as soon as their dependencies are done, so
+    independent stages (e.g. zero volume counting and monthly returns) overlap.
+
+    Returns:
+    dict: Stage name -> 'ran', 'skipped' or 'failed'
+    """
+    by_name = {stage.name: stage for stage in stages}
+    cache = load_cache()
+    hasher = ContentHasher(cache.get('files'))
+    status = {}
+    remaining = dict(by_name)
+    running = {}
+    running_names = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while remaining or running:
+            scheduled = False
+            for name, stage in list(remaining.items()):
+                if any(dep in remaining or dep in running_names for dep in stage.deps if dep in by_name):
+                    continue
+                del remaining[name]
+                scheduled = True
+                if any(status.get(dep) == 'failed' for dep in stage.deps):
+                    status[name] = 'failed'
+                    print(f"Skipping {name}: an upstream stage failed")
+                    continue
+                fingerprint = hasher.fingerprint(stage)
+                outputs_exist = all(os.path.exists(output) for output in stage.outputs)
+                if not force and outputs_exist and cache['stages'].get(name) == fingerprint:
+                    status[name] = 'skipped'
+                    continue
+                running[executor.submit(stage.func, *stage.args)] = (name, fingerprint)
+                running_names.add(name)
+
+            if not running:
+                if remaining and not scheduled:
+                    raise ValueError(f"Dependency cycle between stages: {', '.join(remaining)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                running_names.discard(name)
+                try:
+                    future.result()
+                except Exception as e:
+                    status[name] = 'failed'
+                    print(f"Stage {name} failed: {e}")
+                    continue
+                status[name] = 'ran'
+                # Store the fingerprint of the inputs the stage actually consumed
+                cache['stages'][name] = fingerprint
+                print(f"Finished {name}")
+            cache['files'] = hasher.known
+            save_cache(cache)
+
+    cache['files'] = hasher.known
+    save_cache(cache)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the analysis pipeline, skipping stages whose inputs are unchanged')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Rerun every stage')
+    parser.add_argument('tickers', nargs='*', help='Limit the pipeline to these tickers (default: every ticker in the store)')
+    args = parser.parse_args()
+
+    start = time.time()
+    tickers = [ticker.upper() for ticker in args.tickers]
+    status = run_pipeline(build_stages(tickers or None), workers=args.workers, force=args.force)
+    counts = {state: list(status.values()).count(state) for state in ('ran', 'skipped', 'failed')}
+    print(f"\nPipeline finished in {time.time() - start:.1f}s: "
+          f"{counts['ran']} ran, {counts['skipped']} skipped, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,89 @@
+import argparse
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-import json
+from render_plots import PlotJob, render_plots
 
-def plot_stock_distribution(returns, var_results, stock_code, output_dir):
+# matplotlib and seaborn are imported where the drawing happens, so a run
+# where every chart is already up to date does not pay for loading them
+
+def draw_stock_distribution(fig, returns, var_95, stock_code):
     """
-    Create a plot showing the distribution of monthly returns and 95% Historical VaR level
+    Draw the distribution of monthly returns and the 95% Historical VaR level onto `fig`
     """
-    plt.figure(figsize=(12, 6))
-    
+    import seaborn as sns
+    ax = fig.add_subplot()
+
     # Plot the distribution of returns
-    sns.histplot(data=returns, x='log_return', bins=30, kde=True)
-    
+    sns.histplot(data=returns, x='log_return', bins=30, kde=True, ax=ax)
+
     # Add vertical line for 95% Historical VaR
-    plt.axvline(x=-var_results['historical_var_95'], color='red', linestyle='--', 
-                label='95% Historical VaR')
-    
+    ax.axvline(x=-var_95, color='red', linestyle='--',
+               label='95% Historical VaR')
+
     # Add labels and title
-    plt.title(f'Distribution of Monthly Returns and 95% Historical VaR for {stock_code}')
-    plt.xlabel('Monthly Log Return')
-    plt.ylabel('Frequency')
-    plt.legend()
-    
+    ax.set_title(f'Distribution of Monthly Returns and 95% Historical VaR for {stock_code}')
+    ax.set_xlabel('Monthly Log Return')
+    ax.set_ylabel('Frequency')
+    ax.legend()
+
+
+def draw_stock_distribution_file(fig, returns_file, var_95, stock_code):
+    returns = pd.read_csv(returns_file, index_col=0, parse_dates=True)
+    draw_stock_distribution(fig, returns, var_95, stock_code)
+
+
+def plot_stock_distribution(returns, var_results, stock_code, output_dir):
+    """
+    Create a plot showing the distribution of monthly returns and 95% Historical VaR level
+    """
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(12, 6))
+    draw_stock_distribution(fig, returns, var_results['historical_var_95'], stock_code)
+
     # Save the plot
     output_file = output_dir / f'{stock_code}_var_distribution.png'
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.savefig(output_file, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
 
-def main():
+def distribution_jobs(var_df, returns_dir='monthly_returns', output_dir='plot'):
+    """
+    One PlotJob per stock in `var_df`; a chart is redrawn only when the stock's
+    monthly returns file or its VaR value changed
+    """
+    jobs = []
+    for var_results in var_df.itertuples(index=False):
+        stock_code = var_results.stock_code
+        returns_file = Path(returns_dir) / f'monthly_returns_{stock_code}.csv'
+        if not returns_file.exists():
+            print(f"Error processing {stock_code}: {returns_file} not found")
+            continue
+        jobs.append(PlotJob(
+            Path(output_dir) / f'{stock_code}_var_distribution.png', draw_stock_distribution_file,
+            (str(returns_file), float(var_results.historical_var_95), stock_code),
+            inputs=[returns_file], figsize=(12, 6), dpi=300,
+        ))
+    return jobs
+
+
+def main(workers=None, force=False):
     # Create output directory
     output_dir = Path('plot')
     output_dir.mkdir(exist_ok=True)
-    
+
     # Read VaR results
     var_df = pd.read_csv('var_results/var_results.csv')
-    
-    # Process each stock
-    for stock_code in var_df['stock_code']:
-        print(f"Plotting distribution for {stock_code}...")
-        
-        try:
-            # Read monthly returns
-            returns_file = Path('monthly_returns') / f'monthly_returns_{stock_code}.csv'
-            returns = pd.read_csv(returns_file, index_col=0, parse_dates=True)
-            
-            # Get VaR results for this stock
-            var_results = var_df[var_df['stock_code'] == stock_code].iloc[0]
-            
-            # Create the plot
-            plot_stock_distribution(returns, var_results, stock_code, output_dir)
-            
-        except Exception as e:
-            print(f"Error processing {stock_code}: {str(e)}")
+
+    # Render the charts whose inputs changed, in parallel
+    summary = render_plots(distribution_jobs(var_df, output_dir=output_dir), workers=workers, force=force)
+    for output, error in summary['failed'].items():
+        print(f"Error plotting {output}: {error}")
+    print(f"Plotted {len(summary['rendered'])} distributions, {summary['skipped']} unchanged "
+          f"({summary['seconds']:.2f}s)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Plot the monthly return distribution of every stock')
+    parser.add_argument('--workers', type=int, default=None, help='Render processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='Redraw every chart, even unchanged ones')
+    args = parser.parse_args()
+    main(args.workers, args.force)
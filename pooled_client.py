@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from ssi_fc_data.fc_md_client import MarketDataClient
+from ssi_fc_data.model import AccessTokenModel, api, model
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+token_cache_file = '.fc_token.json'
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on `path` shared by every process on the machine
+    """
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            # LK_LOCK gives up after 10 seconds, so keep trying
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenCache(object):
+    """
+    Access tokens on disk, keyed by API url and consumer ID (the secret is never
+    written), so every process reuses one token until it is about to expire
+    """
+
+    def __init__(self, path=None):
+        self.path = path or token_cache_file
+
+    @staticmethod
+    def key(_config):
+        return hashlib.sha256(f'{_config.url}|{_config.consumerID}'.encode('utf-8')).hexdigest()
+
+    @contextlib.contextmanager
+    def locked(self):
+        with file_lock(self.path + '.lock'):
+            yield
+
+    def read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, _config):
+        token = self.read().get(self.key(_config))
+        if token is None:
+            return None
+        try:
+            token_model = AccessTokenModel(model.AccessToken(token))
+        except (ValueError, KeyError, IndexError):
+            return None
+        return None if token_model.is_expired() else token_model
+
+    def put(self, _config, token):
+        tokens = self.read()
+        tokens[self.key(_config)] = token
+        tmp = self.path + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(tokens, f)
+        os.replace(tmp, self.path)
+
+
+class PooledMarketDataClient(MarketDataClient):
+    """
+    MarketDataClient over one keep-alive requests.Session
+
+    - Connections are pooled (`pool_size` per host) instead of a new TCP/TLS
+      handshake per page, and responses are accepted gzip-compressed.
+    - Headers are built per request, so the client can be shared by threads
+      (the base class writes Authorization into the shared self._header).
+    - The access token comes from a disk cache shared by all processes; only
+      the first process to find it missing or expiring asks the API for one.
+    - When `metrics` (a crawl_metrics.CrawlMetrics) is set, every GET records
+      its latency, wire bytes and status code under the endpoint path.
+    """
+
+    def __init__(self, _config, token_cache=None, pool_size=16, timeout=30):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        self._timeout = timeout
+        self._token_cache = token_cache if token_cache is not None else TokenCache()
+        self._token_lock = threading.Lock()
+        self.token_requests = 0
+        self.metrics = None
+        super(PooledMarketDataClient, self).__init__(_config)
+
+    def _make_post_request(self, _url, data: object = None):
+        response = self._session.post(self._config.url + _url, headers=dict(self._header),
+                                      data=json.dumps(asdict(data)), timeout=self._timeout)
+        return json.loads(response.content)
+
+    def _make_get_request(self, _url: str, req: object):
+        headers = dict(self._header)
+        headers['Authorization'] = 'Bearer ' + self._get_access_token()
+        start = time.perf_counter()
+        response = self._session.get(self._config.url + _url, params=asdict(req), headers=headers,
+                                     timeout=self._timeout)
+        content = response.content
+        if self.metrics is not None:
+            # Content-Length is the compressed size on the wire when the body was gzipped
+            nbytes = int(response.headers.get('Content-Length') or len(content))
+            self.metrics.observe_request(_url, time.perf_counter() - start, nbytes, response.status_code)
+        return json.loads(content)
+
+    def _get_access_token(self):
+        token = self._access_token
+        if token is not None and not token.is_expired():
+            return token.get_access_token()
+        with self._token_lock:
+            if self._access_token is None or self._access_token.is_expired():
+                self._access_token = self._shared_access_token()
+            return self._access_token.get_access_token()
+
+    def _shared_access_token(self):
+        if not self._token_cache:
+            return self._request_access_token()
+        with self._token_cache.locked():
+            token = self._token_cache.get(self._config)
+            if token is None:
+                token = self._request_access_token()
+                self._token_cache.put(self._config, token.get_access_token())
+            return token
+
+    def _request_access_token(self):
+        req = model.accessToken(self._config.consumerID, self._config.consumerSecret)
+        res = self._session.post(self._config.url + api.MD_ACCESS_TOKEN, json.dumps(asdict(req)),
+                                 headers=dict(self._header), timeout=self._timeout)
+        self.token_requests += 1
+        res_obj = model.Response(**(res.json()))
+        if res_obj.status != 200:
+            raise NameError(res_obj.message)
+        return AccessTokenModel(model.AccessToken(**res_obj.data))
+
+    def close(self):
+        self._session.close()
+
+
+def benchmark(n_requests=300, n_clients=8):
+    """
+    Per-request latency of the stock client against the pooled one, and token
+    calls made when several clients start, both against the local mock server
+    """
+    import tempfile
+    import types
+
+    import config
+    from mock_fc_server import start_server
+
+    server, url = start_server()
+    _config = types.SimpleNamespace(**{k: v for k, v in vars(config).items() if not k.startswith('_')})
+    _config.url = url
+    req = model.daily_stock_price('SSI', '01/01/2024', '31/01/2024', 1, 100, '')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TokenCache(os.path.join(tmp, 'token.json'))
+        for name, client in (('MarketDataClient', MarketDataClient(_config)),
+                             ('PooledMarketDataClient', PooledMarketDataClient(_config, cache))):
+            client.daily_stock_price(_config, req)
+            start = time.perf_counter()
+            for _ in range(n_requests):
+                client.daily_stock_price(_config, req)
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed / n_requests * 1000:.2f} ms per request")
+
+        clients = [PooledMarketDataClient(_config, TokenCache(os.path.join(tmp, 'shared.json')))
+                   for _ in range(n_clients)]
+        print(f"{n_clients} pooled clients started with {sum(c.token_requests for c in clients)} token request(s)")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the pooled client with MarketDataClient on the mock server')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+    benchmark(args.requests, args.clients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import data_quality
+
+store_dir = 'store'
+
+# Per-row data_quality bitmask, stored next to the columns but not one of them
+QUALITY_FLAGS = 'QualityFlags'
+
+EPOCH = datetime(1970, 1, 1)
+
+# On-disk dtype of every DailyStockPrice field we keep.
+# TradingDate is stored as days since 1970-01-01.
+COLUMNS = {
+    'TradingDate': np.int32,
+    'PriceChange': np.float64,
+    'PerPriceChange': np.float64,
+    'CeilingPrice': np.float64,
+    'FloorPrice': np.float64,
+    'RefPrice': np.float64,
+    'OpenPrice': np.float64,
+    'HighestPrice': np.float64,
+    'LowestPrice': np.float64,
+    'ClosePrice': np.float64,
+    'AveragePrice': np.float64,
+    'ClosePriceAdjusted': np.float64,
+    'TotalMatchVol': np.int64,
+    'TotalMatchVal': np.float64,
+    'TotalDealVal': np.float64,
+    'TotalDealVol': np.int64,
+    'ForeignBuyVolTotal': np.int64,
+    'ForeignCurrentRoom': np.int64,
+    'ForeignSellVolTotal': np.int64,
+    'ForeignBuyValTotal': np.float64,
+    'ForeignSellValTotal': np.float64,
+    'TotalBuyTrade': np.int64,
+    'TotalBuyTradeVol': np.int64,
+    'TotalSellTrade': np.int64,
+    'TotalSellTradeVol': np.int64,
+    'NetBuySellVol': np.int64,
+    'NetBuySellVal': np.float64,
+    'TotalTradedVol': np.int64,
+    'TotalTradedValue': np.float64,
+}
+
+
+def date_to_days(value):
+    """
+    Convert a 'dd/mm/YYYY' TradingDate string to days since 1970-01-01
+    """
+    return (datetime.strptime(value, '%d/%m/%Y') - EPOCH).days
+
+
+def days_to_date(days):
+    """
+    Convert stored day numbers back to datetime64 values
+    """
+    return np.asarray(days).astype('datetime64[D]')
+
+
+def _parse_value(value, dtype):
+    if value is None or value == '':
+        return 0 if dtype is np.int64 else np.nan
+    if dtype is np.int64:
+        return int(float(value))
+    return float(value)
+
+
+def _parse_chunks(records, chunk_rows):
+    """
+    Typed columns of `records`, `chunk_rows` records at a time, each chunk
+    sorted by TradingDate. Only one chunk is ever held as Python objects.
+    """
+    parsed = {name: [] for name in COLUMNS}
+    fields = [(name, dtype) for name, dtype in COLUMNS.items() if name != 'TradingDate']
+
+    def chunk():
+        columns = {name: np.array(parsed[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        order = np.argsort(columns['TradingDate'], kind='stable')
+        for name in COLUMNS:
+            parsed[name] = []
+        return {name: values[order] for name, values in columns.items()}
+
+    chunks = 0
+    for record in records:
+        parsed['TradingDate'].append(date_to_days(record['TradingDate']))
+        for name, dtype in fields:
+            parsed[name].append(_parse_value(record.get(name), dtype))
+        if len(parsed['TradingDate']) == chunk_rows:
+            chunks += 1
+            yield chunk()
+    # At least one (possibly empty) chunk, so callers can always concatenate
+    if parsed['TradingDate'] or not chunks:
+        yield chunk()
+
+
+def _concat_sorted(chunks):
+    # Stable, so among equal dates the rows of later chunks stay last
+    columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+    order = np.argsort(columns['TradingDate'], kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+
+def records_to_columns(records, deduplicate=True, chunk_rows=4096):
+    """
+    Convert API records (all fields as strings) to typed column arrays,
+    sorted by TradingDate and de-duplicated on it (the last record wins)
+
+    Records are parsed `chunk_rows` at a time, so a generator such as
+    stream_sink.iter_records is never materialised as a list of dicts.
+
+    Parameters:
+    records (iterable): API records
+    deduplicate (bool): False keeps every record, so data_quality can see the
+        repeated dates (overlapping date chunks or repeated pages)
+
+    Returns:
+    dict: Column name -> numpy array
+    """
+    if deduplicate:
+        return records_to_unique_columns(records, chunk_rows)[0]
+    return _concat_sorted(list(_parse_chunks(records, chunk_rows)))
+
+
+def records_to_unique_columns(records, chunk_rows=4096):
+    """
+    records_to_columns with de-duplication, also reporting what was dropped.
+    Each chunk is de-duplicated as it is parsed, so repeated pages do not
+    pile up in memory.
+
+    Returns:
+    tuple: (columns, number of repeated-date rows dropped, array of the
+        TradingDate values that had more than one row)
+    """
+    chunks = []
+    dropped = 0
+    repeated = []
+    for chunk in _parse_chunks(records, chunk_rows):
+        unique = drop_duplicate_dates(chunk)
+        dropped += len(chunk['TradingDate']) - len(unique['TradingDate'])
+        repeated.append(repeated_days(chunk['TradingDate']))
+        chunks.append(unique)
+    columns = _concat_sorted(chunks)
+    unique = drop_duplicate_dates(columns)
+    repeated.append(repeated_days(columns['TradingDate']))
+    return (unique, dropped + len(columns['TradingDate']) - len(unique['TradingDate']),
+            np.unique(np.concatenate(repeated)))
+
+
+def repeated_days(days):
+    """
+    TradingDate values that occur more than once in sorted `days`
+    """
+    days = np.asarray(days)
+    return np.unique(days[1:][days[1:] == days[:-1]])
+
+
+def drop_duplicate_dates(columns):
+    """
+    Keep the last row of every TradingDate in columns sorted by TradingDate
+    """
+    days = np.asarray(columns['TradingDate'])
+    last = np.append(days[1:] != days[:-1], True) if len(days) else np.zeros(0, dtype=bool)
+    if last.all():
+        return columns
+    return {name: np.asarray(values)[last] for name, values in columns.items()}
+
+
+def ticker_dir(ticker, root=None):
+    return Path(root or store_dir) / ticker.upper()
+
+
+def _old_dir(directory):
+    return directory.with_name(directory.name + '.old')
+
+
+def partition_dir(ticker, root=None):
+    """
+    Directory holding the ticker's complete partition: ticker_dir, or the
+    previous version at <TICKER>.old when a write stopped between moving it
+    aside and moving the new one in
+    """
+    target = ticker_dir(ticker, root)
+    if not (target / 'meta.json').exists() and (_old_dir(target) / 'meta.json').exists():
+        return _old_dir(target)
+    return target
+
+
+def recover_partition(ticker, root=None):
+    """
+    Finish or roll back a swap interrupted by a crash: a <TICKER>.old next to
+    a complete partition is removed, one without it is moved back
+    """
+    target = ticker_dir(ticker, root)
+    old = _old_dir(target)
+    if not old.exists():
+        return
+    if (target / 'meta.json').exists():
+        shutil.rmtree(old)
+    else:
+        if target.exists():
+            shutil.rmtree(target)
+        os.rename(old, target)
+
+
+def recover_store(root=None):
+    """
+    recover_partition for every interrupted swap in the store; run on startup
+    by the processes that write to it
+    """
+    root = Path(root or store_dir)
+    if not root.exists():
+        return
+    for path in root.iterdir():
+        if path.name.endswith('.old'):
+            recover_partition(path.name[:-len('.old')], root)
+
+
+def column_stats(columns):
+    """
+    Summary statistics of one ticker's columns, kept next to them in stats.json
+    so liquidity screens do not have to scan the rows
+
+    Returns:
+    dict: rows, first_date/last_date ('YYYY-MM-DD'), zero_volume_days,
+        missing_weekdays (weekdays between the first and last date without a
+        row, holidays included), longest_gap_days (calendar days between two
+        consecutive rows) and median_turnover (median TotalMatchVal)
+    """
+    days = np.asarray(columns['TradingDate'])
+    if len(days) == 0:
+        return {'rows': 0, 'first_date': None, 'last_date': None, 'zero_volume_days': 0,
+                'missing_weekdays': 0, 'longest_gap_days': 0, 'median_turnover': None}
+    dates = days_to_date(days[[0, -1]])
+    turnover = np.asarray(columns['TotalMatchVal'], dtype=np.float64)
+    median_turnover = float(np.nanmedian(turnover)) if not np.isnan(turnover).all() else None
+    return {
+        'rows': int(len(days)),
+        'first_date': str(dates[0]),
+        'last_date': str(dates[1]),
+        'zero_volume_days': int((np.asarray(columns['TotalMatchVol']) == 0).sum()),
+        'missing_weekdays': int(np.busday_count(dates[0], dates[1] + 1) - len(days)),
+        'longest_gap_days': int(np.diff(days).max()) if len(days) > 1 else 0,
+        'median_turnover': median_turnover,
+    }
+
+
+def write_columns(ticker, columns, root=None, duplicates_dropped=0, duplicate_days=None):
+    """
+    Write one ticker's typed columns as a partition of .npy files, with their
+    stats.json (see column_stats) and the per-row data_quality bitmask in
+    QualityFlags.npy, summarized under stats['quality'].
+    `duplicates_dropped` is the number of repeated-date rows removed before
+    the write, recorded in the quality report; the surviving row of each of
+    `duplicate_days` keeps the DUPLICATE_DATE flag.
+    The partition is built in a temporary directory and swapped in, so readers
+    never see a half-written ticker. Between moving the current version aside
+    to <TICKER>.old and moving the new one in, readers fall back to .old (see
+    partition_dir); recover_partition tidies up after a crash there.
+    """
+    recover_partition(ticker, root)
+    target = ticker_dir(ticker, root)
+    tmp = target.with_name(target.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    for name, values in columns.items():
+        np.save(tmp / f'{name}.npy', values)
+    meta = {
+        'ticker': ticker.upper(),
+        'rows': int(len(columns['TradingDate'])),
+        'columns': {name: np.dtype(dtype).name for name, dtype in COLUMNS.items()},
+    }
+    with open(tmp / 'meta.json', 'w') as f:
+        json.dump(meta, f, indent=4)
+    flags = data_quality.check_columns(columns)
+    if duplicate_days is not None and len(duplicate_days):
+        flags[np.isin(columns['TradingDate'], duplicate_days)] |= data_quality.DUPLICATE_DATE
+    np.save(tmp / f'{QUALITY_FLAGS}.npy', flags)
+    stats = column_stats(columns)
+    stats['quality'] = dict(data_quality.summarize(flags), duplicates_dropped=int(duplicates_dropped))
+    with open(tmp / 'stats.json', 'w') as f:
+        json.dump(stats, f, indent=4)
+
+    if target.exists():
+        old = _old_dir(target)
+        os.rename(target, old)
+        os.rename(tmp, target)
+        shutil.rmtree(old)
+    else:
+        os.rename(tmp, target)
+    return meta['rows']
+
+
+def write_ticker(ticker, records, root=None):
+    """
+    Replace one ticker's partition with `records` (any iterable of API records)
+    """
+    columns, duplicates, duplicate_days = records_to_unique_columns(records)
+    return write_columns(ticker, columns, root, duplicates, duplicate_days)
+
+
+def append_ticker(ticker, records, root=None):
+    """
+    Merge `records` into the ticker's existing partition, de-duplicated on
+    TradingDate (the new records win)
+
+    Returns:
+    int: Rows in the partition after the merge
+    """
+    new, duplicates, duplicate_days = records_to_unique_columns(records)
+    if not (partition_dir(ticker, root) / 'meta.json').exists():
+        return write_columns(ticker, new, root, duplicates, duplicate_days)
+
+    old = {name: np.asarray(values) for name, values in load_columns(ticker, root=root).items()}
+    # Keep the old rows whose date is not being replaced
+    keep = ~np.isin(old['TradingDate'], new['TradingDate'])
+    merged = {name: np.concatenate([old[name][keep], new[name]]) for name in COLUMNS}
+    order = np.argsort(merged['TradingDate'], kind='stable')
+    # Kept rows that were flagged as duplicates stay flagged
+    old_flags = np.asarray(load_quality_flags(ticker, root))[keep]
+    duplicate_days = np.union1d(duplicate_days,
+                                old['TradingDate'][keep][(old_flags & data_quality.DUPLICATE_DATE) != 0])
+    duplicates += load_stats(ticker, root).get('quality', {}).get('duplicates_dropped', 0)
+    return write_columns(ticker, {name: values[order] for name, values in merged.items()}, root, duplicates,
+                         duplicate_days)
+
+
+def last_trading_date(ticker, root=None):
+    """
+    Last TradingDate stored for a ticker, or None if it has no partition
+    """
+    if not (partition_dir(ticker, root) / 'meta.json').exists():
+        return None
+    days = load_columns(ticker, ['TradingDate'], root)['TradingDate']
+    if len(days) == 0:
+        return None
+    return EPOCH + timedelta(days=int(days[-1]))
+
+
+def list_tickers(root=None):
+    """
+    Tickers that have a complete partition in the store
+    """
+    root = Path(root or store_dir)
+    if not root.exists():
+        return []
+    # Skip .tmp directories; a .old one counts for its ticker while the swap is under way
+    tickers = set()
+    for p in root.iterdir():
+        name = p.name[:-len('.old')] if p.name.endswith('.old') else p.name
+        if '.' not in name and (p / 'meta.json').exists():
+            tickers.add(name)
+    return sorted(tickers)
+
+
+def load_columns(ticker, columns=None, root=None):
+    """
+    Memory-map the requested columns of one ticker
+
+    Parameters:
+    ticker (str): Stock code
+    columns (list): Column names to load (default: all columns)
+
+    Returns:
+    dict: Column name -> read-only memory-mapped numpy array
+    """
+    directory = partition_dir(ticker, root)
+    names = columns or list(COLUMNS)
+    return {name: np.load(directory / f'{name}.npy', mmap_mode='r') for name in names}
+
+
+def load_quality_flags(ticker, root=None):
+    """
+    Per-row data_quality bitmask of one ticker, computed from its columns for
+    a partition written before the flags were kept
+    """
+    path = partition_dir(ticker, root) / f'{QUALITY_FLAGS}.npy'
+    if path.exists():
+        return np.load(path, mmap_mode='r')
+    return data_quality.check_columns(load_columns(ticker, root=root))
+
+
+def load_stats(ticker, root=None):
+    """
+    stats.json of one ticker, computed from its columns for a partition
+    written before stats were kept
+    """
+    path = partition_dir(ticker, root) / 'stats.json'
+    if path.exists():
+        with open(path, 'r') as f:
+            return json.load(f)
+    return column_stats(load_columns(ticker, ['TradingDate', 'TotalMatchVol', 'TotalMatchVal'], root))
+
+
+def ticker_stats(root=None):
+    """
+    Statistics of every ticker in the store
+
+    Returns:
+    dict: Ticker -> stats (see column_stats)
+    """
+    return {ticker: load_stats(ticker, root) for ticker in list_tickers(root)}
+
+
+def load_ticker(ticker, columns=None, root=None):
+    """
+    Load the requested columns of one ticker as a DataFrame sorted by date,
+    with TradingDate converted to datetime64
+
+    Parameters:
+    ticker (str): Stock code
+    columns (list): Column names to load besides TradingDate (default: all columns)
+
+    Returns:
+    DataFrame: One row per trading day
+    """
+    names = ['TradingDate'] + [c for c in (columns or COLUMNS) if c != 'TradingDate']
+    data = load_columns(ticker, names, root)
+    df = pd.DataFrame({name: np.asarray(values) for name, values in data.items()})
+    df['TradingDate'] = pd.to_datetime(days_to_date(df['TradingDate'].to_numpy()))
+    return df
+
+
+def convert_json_results(results_dir='results', root=None):
+    """
+    One-time conversion of results/stock_price_*.json into the columnar store
+    """
+    converted = 0
+    for file_path in sorted(Path(results_dir).glob('stock_price_*.json')):
+        stock_code = file_path.stem.split('_')[-1]
+        with open(file_path, 'r') as f:
+            records = json.load(f)
+        rows = write_ticker(stock_code, records, root)
+        print(f"Converted {stock_code}: {rows} rows")
+        converted += 1
+    return converted
+
+
+if __name__ == "__main__":
+    count = convert_json_results()
+    print(f"\nConverted {count} tickers into {store_dir}/")
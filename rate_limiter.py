@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket used to enforce the FastConnect request quota
+    across every crawl worker.
+
+    Parameters:
+    rate (float): Tokens added per second (sustained requests per second)
+    capacity (float): Maximum number of tokens that can accumulate (burst size)
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available and consume them
+
+        Returns:
+        float: Seconds spent waiting for the limiter
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                # Sleep just long enough for the missing tokens to arrive
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, tokens=1):
+        """
+        Consume `tokens` if they are available right now, without waiting
+
+        Returns:
+        bool: Whether the tokens were consumed
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
@@ -0,0 +1,174 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Bump to force every chart to be redrawn (e.g. after a matplotlib upgrade)
+RENDER_VERSION = 1
+
+# Figures kept alive inside each worker process, keyed by size
+_figures = {}
+
+
+class PlotJob(object):
+    """
+    One chart to render
+
+    Parameters:
+    output (str): PNG path; its content hash is kept next to it in `<output>.sha256`
+    renderer (callable): Top-level function `renderer(fig, *args)` drawing onto a cleared figure
+    args (tuple): Data passed to the renderer (arrays, frames, numbers, strings)
+    inputs (list): Files the renderer reads itself, hashed by content
+    figsize (tuple): Figure size in inches
+    dpi (int): Resolution of the saved PNG
+    """
+
+    def __init__(self, output, renderer, args=(), inputs=(), figsize=(12, 6), dpi=300):
+        self.output = str(output)
+        self.renderer = renderer
+        self.args = tuple(args)
+        self.inputs = [str(path) for path in inputs]
+        self.figsize = tuple(figsize)
+        self.dpi = dpi
+        self.digest = None
+
+
+def _hash_value(digest, value):
+    if hasattr(value, 'to_numpy'):  # pandas Series / DataFrame
+        if hasattr(value, 'columns'):
+            digest.update(json.dumps([str(column) for column in value.columns]).encode('utf-8'))
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        digest.update(str(value.dtype).encode('utf-8'))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+_source_hashes = {}
+
+
+def _source_hash(func):
+    # The renderer's whole module, so a change to any drawing code redraws its charts
+    path = inspect.getsourcefile(func)
+    if path not in _source_hashes:
+        with open(path, 'rb') as f:
+            _source_hashes[path] = hashlib.sha256(f.read()).hexdigest()
+    return _source_hashes[path]
+
+
+def job_digest(job):
+    """
+    Hash of everything that decides what the chart looks like: renderer code,
+    data, input files, size and resolution
+    """
+    # Named by source file, not __module__, which is '__main__' when the
+    # renderer's script is run directly and its module name when imported
+    name = f'{os.path.basename(inspect.getsourcefile(job.renderer))}:{job.renderer.__qualname__}'
+    digest = hashlib.sha256(f'{RENDER_VERSION}|{name}'.encode('utf-8'))
+    digest.update(_source_hash(job.renderer).encode('utf-8'))
+    digest.update(repr((job.figsize, job.dpi)).encode('utf-8'))
+    for value in job.args:
+        _hash_value(digest, value)
+    for path in job.inputs:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def sidecar_path(output):
+    return f'{output}.sha256'
+
+
+def is_current(job):
+    """
+    True when the PNG exists and was drawn from the same data and code
+    """
+    if not os.path.exists(job.output):
+        return False
+    try:
+        with open(sidecar_path(job.output), 'r') as f:
+            return f.read().strip() == job.digest
+    except OSError:
+        return False
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def worker_figure(figsize):
+    """
+    A cleared figure of `figsize`, reused across the charts a worker draws
+    instead of building (and tearing down) a new pyplot figure per chart
+    """
+    fig = _figures.get(figsize)
+    if fig is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        _figures[figsize] = fig
+    else:
+        fig.clear()
+    return fig
+
+
+def render_job(job):
+    """
+    Draw one chart and record its hash. Runs in a worker process.
+
+    Returns:
+    tuple: (output, error message or None)
+    """
+    try:
+        fig = worker_figure(job.figsize)
+        job.renderer(fig, *job.args)
+        tmp = f'{job.output}.tmp.png'
+        fig.savefig(tmp, dpi=job.dpi, bbox_inches='tight')
+        os.replace(tmp, job.output)
+        # The sidecar goes last, so a crash mid-save redraws the chart next time
+        with open(sidecar_path(job.output), 'w') as f:
+            f.write(job.digest)
+    except Exception as e:
+        return job.output, f'{type(e).__name__}: {e}'
+    return job.output, None
+
+
+def render_plots(jobs, workers=None, force=False):
+    """
+    Render the charts whose data or code changed, across a pool of Agg workers
+
+    Parameters:
+    jobs (list): PlotJob instances
+    workers (int): Worker processes (default: one per core)
+    force (bool): Redraw every chart even if its hash matches
+
+    Returns:
+    dict: 'rendered', 'skipped' and 'failed' (output -> error) plus 'seconds'
+    """
+    start = time.perf_counter()
+    pending = []
+    for job in jobs:
+        job.digest = job_digest(job)
+        if force or not is_current(job):
+            pending.append(job)
+    rendered = []
+    failed = {}
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        # Several charts per task, so each worker reuses its figure across them
+        chunksize = max(1, len(pending) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for output, error in executor.map(render_job, pending, chunksize=chunksize):
+                if error is None:
+                    rendered.append(output)
+                else:
+                    failed[output] = error
+    return {'rendered': rendered, 'skipped': len(jobs) - len(pending), 'failed': failed,
+            'seconds': time.perf_counter() - start}
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+
+def count_weekdays(start_date, end_date):
+    """
+    Number of Monday-Friday days between start_date and end_date (inclusive).
+    This is an upper bound on the trading days (holidays are not subtracted),
+    so windows sized from it never overflow a page.
+    """
+    if end_date < start_date:
+        return 0
+    days = (end_date - start_date).days + 1
+    full_weeks, remainder = divmod(days, 7)
+    weekdays = full_weeks * 5
+    first = start_date.weekday()
+    for offset in range(remainder):
+        if (first + offset) % 7 < 5:
+            weekdays += 1
+    return weekdays
+
+
+def plan_windows(start_date, end_date, page_size=1000, max_window_days=None, fill_ratio=0.9):
+    """
+    Split a date range into request windows that are each expected to fit in one page
+
+    Parameters:
+    start_date (datetime): First day of the range
+    end_date (datetime): Last day of the range (inclusive)
+    page_size (int): Rows returned per page
+    max_window_days (int): Hard cap on a window's calendar length, for endpoints
+        that limit the date range of one request (None for no cap)
+    fill_ratio (float): Fraction of a page a window is allowed to fill, as headroom
+
+    Returns:
+    list: (window_start, window_end) tuples covering the whole range
+    """
+    # Calendar days whose weekdays still fit in `fill_ratio` of a page
+    window_days = max(1, int(page_size * fill_ratio) * 7 // 5)
+    if max_window_days:
+        window_days = min(window_days, max_window_days)
+
+    windows = []
+    while start_date <= end_date:
+        window_end = min(start_date + timedelta(days=window_days - 1), end_date)
+        # Trim the window if it still expects more rows than a page holds
+        while window_end > start_date and count_weekdays(start_date, window_end) > page_size:
+            window_end -= timedelta(days=1)
+        windows.append((start_date, window_end))
+        start_date = window_end + timedelta(days=1)
+    return windows
+
+
+def is_last_page(rows, fetched, page_size, total_record=None):
+    """
+    Decide whether paging can stop after this page, without asking for an empty one
+
+    Parameters:
+    rows (list): Rows returned for the current page (None when the API had no data)
+    fetched (int): Rows already fetched for this window before the current page
+    page_size (int): Requested page size
+    total_record (int): `totalRecord` reported by the API, if any
+
+    Returns:
+    bool: True when no further page needs to be requested
+    """
+    if not rows:
+        return True
+    if total_record is not None:
+        return fetched + len(rows) >= int(total_record)
+    return len(rows) < page_size
+
+
+def planned_requests(windows):
+    """
+    One request per window, since every window is sized to fit in a single page
+    """
+    return len(windows)
+
+
+def legacy_requests(start_date, end_date, chunk_days=30):
+    """
+    Requests the old fixed 29-day chunking needed: one data page plus one
+    empty page per chunk
+    """
+    chunks = 0
+    while start_date <= end_date:
+        chunks += 1
+        start_date = min(start_date + timedelta(days=chunk_days - 1), end_date) + timedelta(days=1)
+    return chunks * 2
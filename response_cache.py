@@ -0,0 +1,205 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pooled_client import PooledMarketDataClient
+
+cache_dir = '.response_cache'
+
+MARKET_UTC_OFFSET = timedelta(hours=7)
+
+
+def request_key(endpoint, req):
+    """
+    Content address of a request: the endpoint plus every field of its request dataclass
+    """
+    fields = json.dumps(asdict(req), sort_keys=True, default=str)
+    return hashlib.sha256(f'{endpoint}?{fields}'.encode('utf-8')).hexdigest()
+
+
+def market_today():
+    return (datetime.now(timezone.utc) + MARKET_UTC_OFFSET).date()
+
+
+def request_end_date(req):
+    """
+    Last date a request covers (toDate, falling back to fromDate), or None for
+    requests without a date range such as securities or index components
+    """
+    fields = asdict(req)
+    for name in ('toDate', 'fromDate'):
+        value = fields.get(name)
+        if value:
+            try:
+                return datetime.strptime(value, '%d/%m/%Y').date()
+            except ValueError:
+                return None
+    return None
+
+
+def is_success(response):
+    return isinstance(response, dict) and str(response.get('status')).lower() in ('success', '200')
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of API responses, one gzip file per request key
+
+    Parameters:
+    directory (str): Cache directory
+    max_bytes (int): Size cap; least recently used entries are evicted beyond it
+    open_ttl (float): Seconds a response for a range that reaches today stays fresh
+    reference_ttl (float): Seconds for undated requests (securities lists, index components)
+
+    Responses for date ranges that ended before today never change and are
+    kept until evicted. Recency is the file's mtime, bumped on every hit.
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024, open_ttl=300, reference_ttl=24 * 3600):
+        self.directory = Path(directory or cache_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.open_ttl = open_ttl
+        self.reference_ttl = reference_ttl
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self.directory.glob('*/*.json.gz'))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key):
+        return self.directory / key[:2] / f'{key}.json.gz'
+
+    def expiry(self, req):
+        end_date = request_end_date(req)
+        if end_date is None:
+            return time.time() + self.reference_ttl
+        if end_date < market_today():
+            return None
+        return time.time() + self.open_ttl
+
+    def get(self, endpoint, req):
+        path = self.path(request_key(endpoint, req))
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, EOFError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if entry['expires'] is not None and entry['expires'] < time.time():
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry['response']
+
+    def put(self, endpoint, req, response):
+        if not is_success(response):
+            return
+        path = self.path(request_key(endpoint, req))
+        path.parent.mkdir(exist_ok=True)
+        payload = gzip.compress(json.dumps({'endpoint': endpoint, 'request': asdict(req),
+                                            'expires': self.expiry(req), 'response': response}).encode('utf-8'))
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        with self._lock:
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+            self._size += len(payload) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries down to 90% of the cap, so eviction
+        # does not run again on the very next put
+        entries = []
+        for path in self.directory.glob('*/*.json.gz'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for path in self.directory.glob('*/*.json.gz'):
+                path.unlink()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'bytes': self._size}
+
+
+class CachingMarketDataClient(PooledMarketDataClient):
+    """
+    Pooled client that answers GET requests from a ResponseCache when it can.
+    Every endpoint method (daily_stock_price, daily_ohlc, securities, ...) is
+    cached, since they all go through _make_get_request.
+
+    `limiter`, if given, is called just before each request that goes to the
+    network, so a caller pacing itself with it is throttled only on cache
+    misses and cached ranges replay at disk speed.
+    """
+
+    def __init__(self, _config, response_cache=None, limiter=None, **kwargs):
+        self.response_cache = response_cache or ResponseCache()
+        self.limiter = limiter
+        super(CachingMarketDataClient, self).__init__(_config, **kwargs)
+
+    def _make_get_request(self, _url: str, req: object):
+        # Key on the full url so a mock server never answers for the live API
+        endpoint = self._config.url + _url
+        response = self.response_cache.get(endpoint, req)
+        if response is None:
+            if self.limiter is not None:
+                self.limiter()
+            response = super(CachingMarketDataClient, self)._make_get_request(_url, req)
+            self.response_cache.put(endpoint, req, response)
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the FastConnect response cache')
+    parser.add_argument('--cache-dir', default=cache_dir)
+    parser.add_argument('--clear', action='store_true', help='Delete every cached response')
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.cache_dir}/")
+        return
+    entries = list(Path(args.cache_dir).glob('*/*.json.gz'))
+    print(f"{len(entries)} cached responses, {cache.stats()['bytes'] / 1e6:.1f} MB in {args.cache_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """
+    Exponential backoff with full jitter
+
+    Parameters:
+    attempt (int): 1-based number of the attempt that just failed
+    base (float): Delay scale in seconds
+    cap (float): Upper bound of the delay in seconds
+
+    Returns:
+    float: Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+    """
+    Shared circuit breaker that pauses every crawl worker when the API keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `wait()` blocks all callers for `reset_timeout` seconds. A single caller
+    is then let through as a probe while the others keep waiting: a success
+    closes the breaker and releases them, a failure opens it again. A probe
+    that reports neither within `reset_timeout` is replaced by another.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Condition(threading.Lock())
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def wait(self):
+        """
+        Block while the breaker is open or another caller is probing
+
+        Returns:
+        float: Seconds spent paused
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            start = time.monotonic()
+            while self._opened_at is not None:
+                now = time.monotonic()
+                if self._probe_started is not None:
+                    remaining = self._probe_started + self.reset_timeout - now
+                else:
+                    remaining = self._opened_at + self.reset_timeout - now
+                if remaining <= 0:
+                    # Half-open: this caller probes the API, the rest wait for its result
+                    self._probe_started = now
+                    break
+                self._lock.wait(min(remaining, 1.0))
+            return time.monotonic() - start
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+            self._lock.notify_all()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_started is not None:
+                # The probe failed: stay open for another reset_timeout
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                print(f"Circuit breaker probe failed. Pausing crawl for {self.reset_timeout:.0f}s")
+            elif self._failures >= self.failure_threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                print(f"Circuit breaker opened after {self._failures} consecutive failures. "
+                      f"Pausing crawl for {self.reset_timeout:.0f}s")
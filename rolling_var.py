@@ -0,0 +1,286 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from var_panel import load_daily_returns_panel
+
+
+def _rank_series(series):
+    """
+    Dense rank of every return within its own row, and each row's sorted
+    distinct returns (rank -> value), NaN-padded like `series`
+    """
+    n_series, length = series.shape
+    lengths = np.count_nonzero(~np.isnan(series), axis=1)
+    values = np.full((n_series, length), np.nan)
+    ranks = np.zeros((n_series, length), dtype=np.int64)
+    for row in range(n_series):
+        distinct, inverse = np.unique(series[row, :lengths[row]], return_inverse=True)
+        values[row, :len(distinct)] = distinct
+        ranks[row, :lengths[row]] = inverse
+    return lengths, values, ranks
+
+
+class RollingWindows(object):
+    """
+    Fixed-size windows over many return series at once, stepped together.
+
+    Each series has a Fenwick tree of counts and sums indexed by the rank of
+    the return within its series, so a push, an eviction, the k-th smallest
+    return and the sum of the returns at or below it are O(log n) each, and
+    every one of them is a numpy operation across all series instead of a
+    Python loop over tickers.
+
+    Parameters:
+    series (ndarray): (n_series, length) returns in date order, each row
+        left-aligned and NaN-padded after its last return
+    size (int): Number of observations in each window
+    """
+
+    def __init__(self, series, size):
+        if size < 1:
+            raise ValueError(f"Window size must be at least 1, got {size}")
+        self.series = np.asarray(series, dtype=np.float64)
+        self.size = size
+        self.lengths, self.values, self.ranks = _rank_series(self.series)
+        length = self.series.shape[1]
+        self._top = 1 << max(length - 1, 0).bit_length()
+        # Tree nodes 1.._top; node 0 stays empty and the last column absorbs
+        # updates that run past the top node
+        self._counts = np.zeros((len(self.series), self._top + 2), dtype=np.int64)
+        self._sums = np.zeros((len(self.series), self._top + 2))
+        self._levels = self._top.bit_length() + 1
+
+    def _update(self, rows, ranks, count, values):
+        index = ranks + 1
+        for _ in range(self._levels):
+            self._counts[rows, index] += count
+            self._sums[rows, index] += values
+            index = np.minimum(index + (index & -index), self._top + 1)
+
+    def step(self, t):
+        """
+        Push the t-th return of every series that has one, evicting the return
+        that falls out of the window
+
+        Returns:
+        ndarray: Rows whose window is full after the push
+        """
+        rows = np.flatnonzero(self.lengths > t)
+        self._update(rows, self.ranks[rows, t], 1, self.series[rows, t])
+        if t >= self.size:
+            self._update(rows, self.ranks[rows, t - self.size], -1, -self.series[rows, t - self.size])
+        return rows if t >= self.size - 1 else rows[:0]
+
+    def kth(self, rows, k):
+        """
+        Rank of the k-th smallest return (k from 1) in each row's window
+        """
+        position = np.zeros(len(rows), dtype=np.int64)
+        k = np.full(len(rows), k, dtype=np.int64)
+        step = self._top
+        while step:
+            counts = self._counts[rows, position + step]
+            take = counts < k
+            position = np.where(take, position + step, position)
+            k = np.where(take, k - counts, k)
+            step >>= 1
+        return position
+
+    def prefix(self, rows, ranks):
+        """
+        Count and sum of the returns ranked at or below `ranks` in each row's window
+        """
+        index = ranks + 1
+        counts = np.zeros(len(rows), dtype=np.int64)
+        sums = np.zeros(len(rows))
+        for _ in range(self._levels):
+            counts += self._counts[rows, index]
+            sums += self._sums[rows, index]
+            index = index - (index & -index)
+        return counts, sums
+
+    def var_es(self, rows, confidence_level=0.95):
+        """
+        Historical VaR (np.percentile's linear interpolation) and Expected
+        Shortfall (mean of the returns at or below the VaR quantile) of full
+        windows, both as positive losses
+        """
+        position = (1 - confidence_level) * (self.size - 1)
+        lower = int(position)
+        upper = min(lower + 1, self.size - 1)
+        lower_rank = self.kth(rows, lower + 1)
+        upper_rank = self.kth(rows, upper + 1)
+        lower_value = self.values[rows, lower_rank]
+        upper_value = self.values[rows, upper_rank]
+        quantile = lower_value + (upper_value - lower_value) * (position - lower)
+        # Ranks are dense, so a prefix up to a rank takes in all of its ties
+        counts, sums = self.prefix(rows, np.where(quantile >= upper_value, upper_rank, lower_rank))
+        return -quantile, -sums / counts
+
+
+def rolling_var_es_batch(series, window, confidence_levels=(0.95,)):
+    """
+    Rolling historical VaR and ES of many return series in one pass
+
+    Parameters:
+    series (ndarray): (n_series, length) returns, each row left-aligned and NaN-padded
+    window (int): Number of observations in each window
+    confidence_levels (list): Confidence levels, e.g. [0.95, 0.99]
+
+    Returns:
+    dict: 'var_<level>' / 'es_<level>' -> (n_series, length) array, NaN
+          until the series' window has filled
+    """
+    if window < 1:
+        raise ValueError(f"Window size must be at least 1, got {window}")
+    series = np.asarray(series, dtype=np.float64)
+    results = {}
+    for conf_level in confidence_levels:
+        results[f'var_{int(conf_level*100)}'] = np.full(series.shape, np.nan)
+        results[f'es_{int(conf_level*100)}'] = np.full(series.shape, np.nan)
+
+    windows = RollingWindows(series, window)
+    for t in range(series.shape[1]):
+        rows = windows.step(t)
+        if not len(rows):
+            continue
+        for conf_level in confidence_levels:
+            var, es = windows.var_es(rows, conf_level)
+            results[f'var_{int(conf_level*100)}'][rows, t] = var
+            results[f'es_{int(conf_level*100)}'][rows, t] = es
+    return results
+
+
+def _left_align(columns):
+    # Each series' non-NaN returns moved to the front of its row
+    positions = [np.flatnonzero(~np.isnan(column)) for column in columns]
+    series = np.full((len(columns), max((len(p) for p in positions), default=0)), np.nan)
+    for row, (column, position) in enumerate(zip(columns, positions)):
+        series[row, :len(position)] = column[position]
+    return series, positions
+
+
+def rolling_var_es(returns, window, confidence_levels=(0.95,)):
+    """
+    Rolling historical VaR and ES of one return series
+
+    Parameters:
+    returns (array-like): Returns in date order; NaNs are skipped (not pushed)
+    window (int): Number of observations in each window
+    confidence_levels (list): Confidence levels, e.g. [0.95, 0.99]
+
+    Returns:
+    dict: 'var_<level>' / 'es_<level>' -> array aligned with `returns`,
+          NaN until the window has filled
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    series, (position,) = _left_align([returns])
+    results = {}
+    for key, values in rolling_var_es_batch(series, window, confidence_levels).items():
+        results[key] = np.full(len(returns), np.nan)
+        results[key][position] = values[0, :len(position)]
+    return results
+
+
+def rolling_var_panel(dates, tickers, panel, window, confidence_levels=(0.95,)):
+    """
+    Batched rolling VaR/ES over every column of a returns panel: all tickers
+    are stepped together through rolling_var_es_batch
+
+    Returns:
+    dict: Ticker -> DataFrame indexed by date with var_<level>/es_<level> columns
+    """
+    panel = np.asarray(panel, dtype=np.float64)
+    series, positions = _left_align(panel.T)
+    results = rolling_var_es_batch(series, window, confidence_levels)
+    dates = np.asarray(dates)
+    frames = {}
+    for row, (ticker, position) in enumerate(zip(tickers, positions)):
+        # Keep only the dates the ticker actually traded with a full window
+        full = slice(window - 1, len(position))
+        frames[ticker] = pd.DataFrame({key: values[row, full] for key, values in results.items()},
+                                      index=pd.Index(dates[position[full]], name='TradingDate'))
+    return frames
+
+
+def naive_rolling_var_es(returns, window, confidence_level=0.95):
+    """
+    Reference implementation: np.percentile over a fresh copy of every window
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[~np.isnan(returns)]
+    var = np.full(len(returns), np.nan)
+    es = np.full(len(returns), np.nan)
+    for i in range(window - 1, len(returns)):
+        values = returns[i - window + 1:i + 1]
+        quantile = np.percentile(values, (1 - confidence_level) * 100)
+        var[i] = -quantile
+        es[i] = -values[values <= quantile].mean()
+    return var, es
+
+
+def benchmark(window=250, length=None, n_series=100, confidence_level=0.95):
+    """
+    Compare the batched windows against the naive per-window percentile,
+    over a panel shaped like the daily returns panel
+    """
+    length = length or max(1000, 4 * window)
+    rng = np.random.default_rng(0)
+    series = rng.standard_t(4, size=(n_series, length)) * 0.02
+
+    start = time.perf_counter()
+    batched = rolling_var_es_batch(series, window, [confidence_level])
+    batched_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive = [naive_rolling_var_es(returns, window, confidence_level) for returns in series]
+    naive_time = time.perf_counter() - start
+
+    level = int(confidence_level * 100)
+    max_diff = max(np.nanmax(np.abs(batched[f'var_{level}'] - np.array([var for var, _ in naive]))),
+                   np.nanmax(np.abs(batched[f'es_{level}'] - np.array([es for _, es in naive]))))
+    print(f"Window {window}, {n_series} series of {length} returns:")
+    print(f"  Batched: {batched_time * 1000:.1f} ms")
+    print(f"  Naive np.percentile: {naive_time * 1000:.1f} ms")
+    print(f"  Speedup: {naive_time / batched_time:.1f}x, max difference: {max_diff:.2e}")
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling historical VaR and Expected Shortfall per ticker')
+    parser.add_argument('--window', type=positive_int, default=250, help='Rolling window in trading days')
+    parser.add_argument('--levels', type=float, nargs='+', default=[0.95, 0.99])
+    parser.add_argument('--output-dir', default='rolling_var')
+    parser.add_argument('--benchmark', action='store_true', help='Compare against the naive implementation and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for window in (60, 250, 1000):
+            benchmark(window=window)
+        return
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(exist_ok=True)
+
+    dates, tickers, panel = load_daily_returns_panel()
+    start = time.time()
+    series = rolling_var_panel(dates, tickers, panel, args.window, args.levels)
+    print(f"Rolling VaR/ES for {len(tickers)} stocks in {time.time() - start:.2f}s")
+
+    for ticker, frame in series.items():
+        frame.to_csv(output_dir / f'rolling_var_{ticker}.csv')
+    print(f"Results saved to {output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from var_panel import load_daily_returns_panel
+
+METHODS = ('bootstrap', 'normal', 't')
+
+# Fewest daily returns a ticker needs to be simulated (a sample standard deviation needs two)
+min_returns = 2
+
+
+def ticker_rng(ticker, seed=0):
+    """
+    Random generator seeded from the base seed and the ticker, so every ticker
+    gets the same paths no matter which worker process simulates it
+    """
+    return np.random.default_rng(np.random.SeedSequence([seed, zlib.crc32(ticker.encode('utf-8'))]))
+
+
+def ewma_volatility(returns, decay=0.94):
+    """
+    RiskMetrics EWMA volatility. sigma[t] only uses returns before t, and the
+    last element is the one-step-ahead forecast.
+
+    Returns:
+    ndarray: len(returns) + 1 volatilities
+    """
+    variance = np.empty(len(returns) + 1)
+    variance[0] = np.var(returns)
+    for i, value in enumerate(returns):
+        variance[i + 1] = decay * variance[i] + (1 - decay) * value * value
+    return np.sqrt(variance)
+
+
+def simulate_horizon_returns(returns, method='bootstrap', n_paths=100000, horizon=21,
+                             batch_size=20000, rng=None, decay=0.94):
+    """
+    Simulate `n_paths` cumulative log returns over `horizon` trading days
+
+    Parameters:
+    returns (array-like): Historical daily log returns
+    method (str): 'bootstrap' (filtered historical simulation with EWMA volatility),
+        'normal' or 't' (Monte Carlo from a fitted distribution)
+    n_paths (int): Number of simulated paths
+    horizon (int): Trading days per path (21 = one month)
+    batch_size (int): Paths generated per vectorised batch, which bounds memory
+    rng (Generator): Random generator (see ticker_rng)
+
+    Returns:
+    ndarray: n_paths simulated horizon returns
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[~np.isnan(returns)]
+    rng = rng or np.random.default_rng()
+    totals = np.empty(n_paths)
+
+    if method == 'bootstrap':
+        sigma = ewma_volatility(returns, decay)
+        residuals = returns / sigma[:-1]
+        current_variance = sigma[-1] ** 2
+    elif method == 'normal':
+        mean, std = returns.mean(), returns.std(ddof=1)
+    elif method == 't':
+        df, loc, scale = stats.t.fit(returns)
+    else:
+        raise ValueError(f"Unknown simulation method: {method}")
+
+    for start in range(0, n_paths, batch_size):
+        size = min(batch_size, n_paths - start)
+        if method == 'bootstrap':
+            # Resample standardised residuals and rescale them by a volatility
+            # that keeps updating along each path
+            variance = np.full(size, current_variance)
+            total = np.zeros(size)
+            for _ in range(horizon):
+                shock = residuals[rng.integers(0, len(residuals), size)] * np.sqrt(variance)
+                total += shock
+                variance = decay * variance + (1 - decay) * shock * shock
+        elif method == 'normal':
+            # A sum of i.i.d. normal days is itself normal, so draw it directly
+            total = rng.normal(mean * horizon, std * np.sqrt(horizon), size=size)
+        else:
+            total = (rng.standard_t(df, size=(size, horizon)) * scale + loc).sum(axis=1)
+        totals[start:start + size] = total
+    return totals
+
+
+def simulate_ticker_var(ticker, returns, method='bootstrap', confidence_levels=(0.95, 0.99),
+                        n_paths=100000, horizon=21, seed=0):
+    """
+    Simulation VaR and ES of one ticker over the horizon, as positive losses.
+    Tickers with fewer than `min_returns` returns get NaN.
+
+    Returns:
+    dict: stock_code plus var_<level>/es_<level> values
+    """
+    results = {'stock_code': ticker}
+    returns = np.asarray(returns, dtype=np.float64)
+    if np.count_nonzero(~np.isnan(returns)) < min_returns:
+        # Nothing to resample or fit (e.g. a ticker listed after the panel ends)
+        for conf_level in confidence_levels:
+            results[f'var_{int(conf_level*100)}'] = np.nan
+            results[f'es_{int(conf_level*100)}'] = np.nan
+        return results
+
+    simulated = simulate_horizon_returns(returns, method, n_paths, horizon, rng=ticker_rng(ticker, seed))
+    quantiles = np.percentile(simulated, [(1 - level) * 100 for level in confidence_levels])
+    for conf_level, quantile in zip(confidence_levels, quantiles):
+        results[f'var_{int(conf_level*100)}'] = -quantile
+        results[f'es_{int(conf_level*100)}'] = -simulated[simulated <= quantile].mean()
+    return results
+
+
+def _simulate_task(task):
+    return simulate_ticker_var(*task)
+
+
+def simulate_panel_var(tickers, panel, method='bootstrap', confidence_levels=(0.95, 0.99),
+                       n_paths=100000, horizon=21, seed=0, workers=None):
+    """
+    Simulation VaR for every column of a daily returns panel, split across a
+    process pool by ticker
+
+    Returns:
+    DataFrame: One row per ticker
+    """
+    tasks = [(ticker, panel[:, column], method, tuple(confidence_levels), n_paths, horizon, seed)
+             for column, ticker in enumerate(tickers)]
+    if workers == 1:
+        rows = [_simulate_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_simulate_task, tasks, chunksize=4))
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo and bootstrap VaR over a monthly horizon')
+    parser.add_argument('--method', choices=METHODS, default='bootstrap')
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--horizon', type=int, default=21, help='Horizon in trading days')
+    parser.add_argument('--levels', type=float, nargs='+', default=[0.95, 0.99])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    dates, tickers, panel = load_daily_returns_panel()
+    start = time.time()
+    var_df = simulate_panel_var(tickers, panel, args.method, args.levels, args.paths,
+                                args.horizon, args.seed, args.workers)
+    print(f"Simulated {args.paths} paths x {len(tickers)} stocks ({args.method}) in {time.time() - start:.1f}s")
+
+    output_dir = Path('var_results')
+    output_dir.mkdir(exist_ok=True)
+    output_file = output_dir / f'simulation_var_{args.method}.csv'
+    var_df.to_csv(output_file, index=False)
+
+    print("\nSimulation VaR Summary Statistics:")
+    print(var_df.describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from ssi_fc_data.fc_md_stream import MarketDataStream
+
+POLICIES = ('block', 'drop-oldest', 'coalesce')
+
+# Symbol of a raw message without parsing it; Content is itself a JSON string,
+# so the quotes around the key and value may be escaped
+SYMBOL_PATTERN = re.compile(r'Symbol\\*"\s*:\s*\\*"([^"\\]+)')
+
+
+def message_symbol(message):
+    """
+    Symbol of a raw or already parsed stream message, or None
+    """
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    if isinstance(message, str):
+        match = SYMBOL_PATTERN.search(message)
+        return match.group(1) if match else None
+    content = message.get('Content') or message.get('content') or {}
+    if isinstance(content, str):
+        match = SYMBOL_PATTERN.search(content)
+        return match.group(1) if match else None
+    return content.get('Symbol')
+
+
+class DispatchQueue(object):
+    """
+    Bounded queue between the stream receive thread and the dispatch workers
+
+    Parameters:
+    maxsize (int): Messages (or distinct symbols, when coalescing) held at most
+    policy (str): What a full queue does with a new message:
+        'block' waits for room (backpressure reaches the receive thread),
+        'drop-oldest' evicts the oldest queued message,
+        'coalesce' keeps only the latest message per symbol, so a symbol that
+        is already queued is replaced in place and never grows the queue
+    """
+
+    def __init__(self, maxsize=10000, policy='drop-oldest'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items = OrderedDict() if policy == 'coalesce' else deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._sequence = 0
+        self.closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def put(self, message, key=None):
+        """
+        Queue a message; returns False if it was dropped because the queue is closed
+        """
+        item = (time.monotonic(), message)
+        with self._lock:
+            if self.closed:
+                return False
+            if self.policy == 'coalesce':
+                if key is not None and key in self._items:
+                    # Keep the queue position (and enqueue time) of the first
+                    # pending message so a busy symbol is not starved
+                    self._items[key] = (self._items[key][0], message)
+                    self.coalesced += 1
+                    self.enqueued += 1
+                    return True
+                if key is None:
+                    self._sequence += 1
+                    key = ('', self._sequence)
+                if len(self._items) >= self.maxsize:
+                    self._items.popitem(last=False)
+                    self.dropped += 1
+                self._items[key] = item
+            else:
+                if len(self._items) >= self.maxsize:
+                    if self.policy == 'block':
+                        while len(self._items) >= self.maxsize and not self.closed:
+                            self._not_full.wait()
+                        if self.closed:
+                            return False
+                    else:
+                        self._items.popleft()
+                        self.dropped += 1
+                self._items.append(item)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._not_empty.notify()
+            return True
+
+    def get_batch(self, max_items=100, timeout=0.05):
+        """
+        Up to `max_items` queued (enqueue time, message) pairs, oldest first.
+        Waits up to `timeout` seconds for the first one; returns [] on timeout
+        or once the queue is closed and empty.
+        """
+        with self._lock:
+            if not self._items and not self.closed:
+                self._not_empty.wait(timeout)
+            batch = []
+            if self.policy == 'coalesce':
+                while self._items and len(batch) < max_items:
+                    batch.append(self._items.popitem(last=False)[1])
+            else:
+                while self._items and len(batch) < max_items:
+                    batch.append(self._items.popleft())
+            if batch:
+                self._not_full.notify_all()
+            return batch
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+
+class StreamDispatcher(object):
+    """
+    Runs stream handlers on worker threads in micro-batches, so a slow handler
+    never stalls the SignalR receive thread
+
+    Handlers receive a list of parsed messages. A handler exception is passed
+    to the error handlers as is and does not stop delivery to the others.
+    With more than one worker, batches may be handled out of order.
+
+    Parameters:
+    maxsize (int), policy (str): See DispatchQueue
+    batch_size (int): Messages delivered per handler call at most
+    batch_timeout (float): Seconds a worker waits for the first message of a batch
+    workers (int): Dispatch threads
+    """
+
+    def __init__(self, maxsize=10000, policy='drop-oldest', batch_size=100, batch_timeout=0.05, workers=1):
+        self.queue = DispatchQueue(maxsize, policy)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.workers = workers
+        self.handlers = []
+        self.error_handlers = []
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.delivered = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def add_handler(self, handler, batched=True):
+        """
+        Register a handler; `batched=False` wraps a per-message handler such as
+        the ones MarketDataStream.start takes
+        """
+        if not batched:
+            single = handler
+
+            def handler(messages):
+                for message in messages:
+                    single(message)
+        self.handlers.append(handler)
+
+    def add_error_handler(self, handler):
+        self.error_handlers.append(handler)
+
+    def submit(self, message):
+        """
+        Called on the receive thread: queue the raw message without parsing it
+        """
+        key = message_symbol(message) if self.queue.policy == 'coalesce' else None
+        return self.queue.put(message, key)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'stream-dispatch-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stop accepting messages, deliver what is still queued and join the workers
+        """
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while True:
+            batch = self.queue.get_batch(self.batch_size, self.batch_timeout)
+            if not batch:
+                if self.queue.closed and not len(self.queue):
+                    return
+                continue
+            lag = time.monotonic() - batch[0][0]
+            messages = []
+            for _, message in batch:
+                try:
+                    messages.append(json.loads(message) if isinstance(message, (str, bytes)) else message)
+                except ValueError as e:
+                    self._error(e)
+            for handler in self.handlers:
+                try:
+                    handler(messages)
+                except Exception as e:
+                    self._error(e)
+            with self._stats_lock:
+                self.delivered += len(messages)
+                self.batches += 1
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+
+    def _error(self, error):
+        with self._stats_lock:
+            self.errors += 1
+        for handler in self.error_handlers:
+            handler(error)
+
+    def counters(self):
+        """
+        Queue depth, lag (seconds from receive to delivery of a batch's oldest
+        message), drops and delivery counts
+        """
+        with self._stats_lock:
+            return {
+                'depth': len(self.queue),
+                'max_depth': self.queue.max_depth,
+                'received': self.queue.enqueued,
+                'delivered': self.delivered,
+                'batches': self.batches,
+                'dropped': self.queue.dropped,
+                'coalesced': self.queue.coalesced,
+                'errors': self.errors,
+                'last_lag': self.last_lag,
+                'max_lag': self.max_lag,
+            }
+
+
+class DispatchingMarketDataStream(MarketDataStream):
+    """
+    MarketDataStream whose receive callback only queues the raw message; parsing
+    and the handlers run on the dispatcher's workers
+    """
+
+    def __init__(self, _config, client, dispatcher=None, on_close=None, on_open=None):
+        super(DispatchingMarketDataStream, self).__init__(_config, client, on_close, on_open)
+        self.dispatcher = dispatcher or StreamDispatcher()
+
+    def _on_message(self, _message):
+        self.dispatcher.submit(_message)
+
+    def start(self, _on_message, _on_error, _selected_channel, *argv):
+        """
+        Same arguments as MarketDataStream.start; `_on_message` is called once
+        per message, register batched handlers on the dispatcher directly
+        """
+        if _on_message is not None:
+            self.dispatcher.add_handler(_on_message, batched=False)
+        self.dispatcher.add_error_handler(_on_error)
+        self.dispatcher.start()
+        super(DispatchingMarketDataStream, self).start(None, _on_error, _selected_channel, *argv)
+
+    def stop(self):
+        self.connection.close()
+        self.dispatcher.stop()
+
+
+def benchmark(n_messages=100000, n_symbols=400, handler_delay=0.0005, maxsize=5000, batch_size=100):
+    """
+    Push synthetic ticks faster than a slow batch handler can take them and
+    compare the backpressure policies
+    """
+    from stream_risk import synthetic_messages
+
+    messages = synthetic_messages(n_messages, n_symbols)
+    for policy in POLICIES:
+        dispatcher = StreamDispatcher(maxsize, policy, batch_size)
+        dispatcher.add_handler(lambda batch: time.sleep(handler_delay * len(batch) ** 0.5))
+        dispatcher.start()
+        start = time.perf_counter()
+        for message in messages:
+            dispatcher.submit(message)
+        receive_time = time.perf_counter() - start
+        dispatcher.stop()
+        counters = dispatcher.counters()
+        print(f"{policy:12s} receive thread {n_messages / receive_time:>10,.0f} msg/s, "
+              f"delivered {counters['delivered']}, dropped {counters['dropped']}, "
+              f"coalesced {counters['coalesced']}, max depth {counters['max_depth']}, "
+              f"max lag {counters['max_lag'] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream market data through a bounded, batched dispatch queue')
+    parser.add_argument('--channel', default='X-TRADE:ALL', help='Stream channel to subscribe to')
+    parser.add_argument('--policy', choices=POLICIES, default='drop-oldest')
+    parser.add_argument('--maxsize', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--benchmark', action='store_true', help='Compare the policies on synthetic ticks and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(maxsize=args.maxsize, batch_size=args.batch_size)
+        return
+
+    import config
+    from ssi_fc_data.fc_md_client import MarketDataClient
+
+    dispatcher = StreamDispatcher(args.maxsize, args.policy, args.batch_size)
+    dispatcher.add_handler(lambda messages: print(f"{len(messages)} messages, counters: {dispatcher.counters()}"))
+    stream = DispatchingMarketDataStream(config, MarketDataClient(config), dispatcher)
+    stream.start(None, print, args.channel)
+    message = None
+    while message != "exit()":
+        message = input(">> ")
+        if message is not None and message != "" and message != "exit()":
+            stream.swith_channel(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+log_dir = 'stream_log'
+
+# Trading days follow Vietnam time (UTC+7) regardless of the recorder's timezone
+MARKET_UTC_OFFSET = 7 * 3600
+
+
+def trading_day(timestamp):
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp + MARKET_UTC_OFFSET))
+
+
+def encode_line(timestamp, message):
+    """
+    One log line: receive time, a tab, then the raw message on a single line
+    """
+    if not isinstance(message, str):
+        message = json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+    elif '\n' in message:
+        message = json.dumps(json.loads(message), ensure_ascii=False, separators=(',', ':'))
+    return f"{timestamp:.6f}\t{message}\n"
+
+
+class StreamRecorder(object):
+    """
+    Append-only, gzip-compressed log of raw stream messages with their receive
+    time, one segment per trading day and recorder session:
+    stream_log/2025-06-09.0.ndjson.gz, then 2025-06-09.1.ndjson.gz after a restart
+
+    A restart never appends to a segment a crash may have left torn, so a
+    recorder can be restarted on the same day. The stream is flushed every
+    `flush_interval` seconds; a crash loses at most that much. With
+    `background_flush` a timer thread flushes a quiet stream too, otherwise
+    call flush_if_due between messages.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0, clock=time.time, background_flush=False):
+        self.directory = Path(directory or log_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._day = None
+        self._file = None
+        self._last_flush = 0.0
+        self._unflushed = False
+        self._stop = threading.Event()
+        self._flusher = None
+        if background_flush:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def segment_path(self, day):
+        """
+        Path of a new segment for `day`, numbered after the day's existing ones
+        """
+        numbers = [segment_number(path) for path in self.directory.glob(f'{day}.*ndjson.gz')]
+        return self.directory / f'{day}.{max(numbers, default=-1) + 1}.ndjson.gz'
+
+    def record(self, message):
+        timestamp = self.clock()
+        line = encode_line(timestamp, message).encode('utf-8')
+        with self._lock:
+            day = trading_day(timestamp)
+            if day != self._day:
+                self._close_segment()
+                self._file = gzip.open(self.segment_path(day), 'ab', compresslevel=6)
+                self._day = day
+            self._file.write(line)
+            self.recorded += 1
+            self._unflushed = True
+            self._flush_if_due(timestamp)
+
+    def flush_if_due(self):
+        """
+        Flush buffered messages if `flush_interval` has passed since the last
+        flush, so the tail of a stream that went quiet still reaches the disk
+        """
+        with self._lock:
+            self._flush_if_due(self.clock())
+
+    def _flush_if_due(self, now):
+        if self._unflushed and now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+            self._unflushed = False
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush_if_due()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._unflushed = False
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self._lock:
+            self._close_segment()
+            self._day = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def attach(stream, recorder):
+    """
+    Record every message a MarketDataStream (or a subclass) receives, before
+    its own handling. Call before stream.start().
+    """
+    receive = stream._on_message
+
+    def _on_message(_message):
+        recorder.record(_message)
+        receive(_message)
+
+    stream._on_message = _on_message
+    return stream
+
+
+def segment_number(path):
+    """
+    Session number of a segment; -1 for a day-only name (YYYY-MM-DD.ndjson.gz)
+    written before segments were numbered
+    """
+    parts = Path(path).name.split('.')
+    return int(parts[1]) if len(parts) == 4 and parts[1].isdigit() else -1
+
+
+def segments(directory=None, days=None):
+    """
+    Segment files in day and session order, optionally limited to the given days
+    """
+    paths = sorted(Path(directory or log_dir).glob('*.ndjson.gz'),
+                   key=lambda path: (path.name.split('.')[0], segment_number(path)))
+    if days:
+        days = set(days)
+        paths = [path for path in paths if path.name.split('.')[0] in days]
+    return paths
+
+
+def read_log(directory=None, days=None):
+    """
+    Yield (receive time, raw message) from the log in recording order. A torn
+    gzip member (recorder killed mid-write) ends that segment instead of
+    failing the replay; the next session's segment carries on.
+    """
+    for path in segments(directory, days):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    timestamp, _, message = line.rstrip('\n').partition('\t')
+                    if message:
+                        yield float(timestamp), message
+            except (EOFError, gzip.BadGzipFile, zlib.error):
+                print(f"{path.name}: log ends with an incomplete block")
+
+
+def replay(on_message, directory=None, speed=None, days=None, parse=True):
+    """
+    Feed a recorded log through a stream handler
+
+    Parameters:
+    on_message (callable): Handler with the MarketDataStream handler interface
+        (receives json.loads of the message), or a raw receiver such as
+        MarketDataStream._on_message / StreamDispatcher.submit with parse=False
+    speed (float): None replays as fast as possible; 1.0 keeps the original
+        gaps between messages, 10.0 replays ten times faster
+    days (list): Trading days (YYYY-MM-DD) to replay, default all
+
+    Returns:
+    int: Number of messages replayed
+    """
+    count = 0
+    first_recorded = None
+    started = time.monotonic()
+    for timestamp, message in read_log(directory, days):
+        if speed:
+            if first_recorded is None:
+                first_recorded = timestamp
+            delay = (timestamp - first_recorded) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        on_message(json.loads(message) if parse else message)
+        count += 1
+    return count
+
+
+def write_synthetic_log(n_messages, directory=None, rate=5000.0, start=None):
+    """
+    Record synthetic trade ticks at `rate` messages per (recorded) second, for
+    load tests without a live connection
+    """
+    from stream_risk import synthetic_messages
+
+    start = start or time.time()
+    clock_values = iter(start + i / rate for i in range(n_messages))
+    with StreamRecorder(directory, clock=lambda: next(clock_values)) as recorder:
+        for message in synthetic_messages(n_messages):
+            recorder.record(message)
+    return recorder.recorded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record the market data stream to a compressed log, or replay it')
+    parser.add_argument('--channel', default='X-TRADE:ALL', help='Stream channel to record')
+    parser.add_argument('--log-dir', default=log_dir)
+    parser.add_argument('--replay', action='store_true', help='Replay the log instead of recording')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='Replay speed relative to the recording (default: as fast as possible)')
+    parser.add_argument('--days', nargs='*', help='Trading days to replay (YYYY-MM-DD)')
+    parser.add_argument('--synthetic', type=int, default=0, help='Write this many synthetic ticks to the log and exit')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        count = write_synthetic_log(args.synthetic, args.log_dir)
+        size = sum(os.path.getsize(path) for path in segments(args.log_dir))
+        print(f"Recorded {count} synthetic messages to {args.log_dir}/ ({size / 1e6:.1f} MB on disk)")
+        return
+
+    if args.replay:
+        start = time.perf_counter()
+        count = replay(lambda message: None, args.log_dir, args.speed, args.days)
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {count} messages in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} messages/s)")
+        return
+
+    import config
+    from ssi_fc_data.fc_md_client import MarketDataClient
+    from ssi_fc_data.fc_md_stream import MarketDataStream
+
+    recorder = StreamRecorder(args.log_dir, background_flush=True)
+    stream = attach(MarketDataStream(config, MarketDataClient(config)), recorder)
+    stream.start(lambda message: None, print, args.channel)
+    message = None
+    while message != "exit()":
+        message = input(">> ")
+        if message is not None and message != "" and message != "exit()":
+            stream.swith_channel(message)
+    recorder.close()
+    print(f"Recorded {recorder.recorded} messages to {args.log_dir}/")
+
+
+if __name__ == "__main__":
+    main()
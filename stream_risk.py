@@ -0,0 +1,306 @@
+import argparse
+import json
+import math
+import os
+import time
+from array import array
+
+import numpy as np
+from scipy import stats
+
+
+def parse_message(message):
+    """
+    Unwrap a FastConnect stream message, e.g.
+    {"DataType": "X", "Content": "{\"RType\":\"X\",\"Symbol\":\"SSI\",\"LastPrice\":12700,...}"}
+
+    Parameters:
+    message (str or dict): Raw message text, or the dict MarketDataStream hands to its handlers
+
+    Returns:
+    tuple: (data type, content dict)
+    """
+    if isinstance(message, (str, bytes)):
+        message = json.loads(message)
+    data_type = message.get('DataType') or message.get('datatype') or message.get('Datatype')
+    content = message.get('Content') or message.get('content')
+    if isinstance(content, (str, bytes)):
+        content = json.loads(content)
+    return data_type, content or {}
+
+
+def message_price(content):
+    """
+    Price carried by a trade (X/Trade: LastPrice) or bar (B: Close) message, or None
+    """
+    price = content.get('LastPrice')
+    if price is None:
+        price = content.get('Close')
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+class TickerState(object):
+    """
+    Return statistics of one ticker over its last `size` returns.
+
+    Returns live in a preallocated array ring buffer and the window sums are
+    updated in O(1) per tick, so the state never grows after construction.
+    The sums are rebuilt from the buffer each time the ring wraps, which keeps
+    floating point drift from accumulating.
+    """
+
+    __slots__ = ('symbol', 'size', 'returns', 'head', 'count', 'total', 'total_sq',
+                 'last_price', 'ewma_variance', 'decay', 'ticks')
+
+    def __init__(self, symbol, size, decay=0.94):
+        self.symbol = symbol
+        self.size = size
+        self.returns = array('d', bytes(8 * size))
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.last_price = None
+        self.ewma_variance = None
+        self.decay = decay
+        self.ticks = 0
+
+    def update(self, price):
+        """
+        Push a new price; returns False when it does not produce a return
+        (first price of the ticker)
+        """
+        self.ticks += 1
+        previous = self.last_price
+        self.last_price = price
+        if previous is None:
+            return False
+
+        value = math.log(price / previous)
+        head = self.head
+        if self.count == self.size:
+            oldest = self.returns[head]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+        else:
+            self.count += 1
+        self.returns[head] = value
+        self.total += value
+        self.total_sq += value * value
+        head += 1
+        if head == self.size:
+            head = 0
+            self.total = math.fsum(self.returns)
+            self.total_sq = math.fsum(r * r for r in self.returns)
+        self.head = head
+
+        if self.ewma_variance is None:
+            self.ewma_variance = value * value
+        else:
+            self.ewma_variance = self.decay * self.ewma_variance + (1 - self.decay) * value * value
+        return True
+
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def std(self):
+        if self.count < 2:
+            return float('nan')
+        variance = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    def window(self):
+        """
+        Returns currently in the window (a view over the buffer, unordered)
+        """
+        return np.frombuffer(self.returns, dtype=np.float64, count=self.count)
+
+
+class StreamRiskService(object):
+    """
+    Per-ticker return statistics and VaR kept up to date from stream ticks
+
+    Parameters:
+    window (int): Returns kept per ticker
+    confidence_levels (list): VaR confidence levels
+    publish_interval (float): Seconds between published snapshots
+    publish (callable): Receives the list of snapshot rows; prints a summary by default
+    clock (callable): Time source, replaceable for replays
+    """
+
+    def __init__(self, window=500, confidence_levels=(0.95, 0.99), publish_interval=5.0,
+                 publish=None, clock=time.monotonic):
+        self.window = window
+        self.confidence_levels = tuple(confidence_levels)
+        # Normal quantiles are fixed, so look them up once instead of per tick
+        self.z_scores = tuple(float(-stats.norm.ppf(1 - level)) for level in self.confidence_levels)
+        self.publish_interval = publish_interval
+        self.publish = publish or print_snapshot
+        self.clock = clock
+        self.states = {}
+        self.messages = 0
+        self.skipped = 0
+        self._next_publish = clock() + publish_interval
+
+    def on_message(self, message):
+        """
+        Handler for MarketDataStream.start: update the ticker and publish if due
+        """
+        self.messages += 1
+        try:
+            data_type, content = parse_message(message)
+        except (ValueError, TypeError, AttributeError):
+            self.skipped += 1
+            return
+        symbol = content.get('Symbol')
+        price = message_price(content)
+        if symbol is None or price is None:
+            self.skipped += 1
+            return
+
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = TickerState(symbol, self.window)
+        state.update(price)
+
+        if self.clock() >= self._next_publish:
+            self.publish_now()
+
+    def on_error(self, error):
+        print(f"Stream error: {error}")
+
+    def ticker_var(self, state):
+        """
+        Parametric, EWMA and historical VaR of one ticker (positive losses)
+        """
+        row = {'symbol': state.symbol, 'last_price': state.last_price,
+               'returns': state.count, 'ticks': state.ticks}
+        mean, std = state.mean(), state.std()
+        ewma_std = math.sqrt(state.ewma_variance) if state.ewma_variance is not None else float('nan')
+        window = state.window()
+        quantiles = (np.percentile(window, [(1 - level) * 100 for level in self.confidence_levels])
+                     if state.count else [float('nan')] * len(self.confidence_levels))
+        for level, z, quantile in zip(self.confidence_levels, self.z_scores, quantiles):
+            row[f'parametric_var_{int(level*100)}'] = -(mean - z * std)
+            row[f'ewma_var_{int(level*100)}'] = z * ewma_std
+            row[f'historical_var_{int(level*100)}'] = -float(quantile)
+        return row
+
+    def snapshot(self):
+        return [self.ticker_var(state) for state in self.states.values() if state.count >= 2]
+
+    def publish_now(self):
+        self._next_publish = self.clock() + self.publish_interval
+        self.publish(self.snapshot())
+
+    def replay(self, messages):
+        """
+        Feed recorded messages (raw strings or dicts) through the service as
+        fast as possible, then publish a final snapshot
+        """
+        for message in messages:
+            self.on_message(message)
+        self.publish_now()
+
+    def start(self, channel):
+        """
+        Subscribe to the live FastConnect hub
+        """
+        import config
+        from ssi_fc_data.fc_md_client import MarketDataClient
+        from ssi_fc_data.fc_md_stream import MarketDataStream
+
+        stream = MarketDataStream(config, MarketDataClient(config))
+        stream.start(self.on_message, self.on_error, channel)
+        return stream
+
+
+def print_snapshot(rows):
+    if not rows:
+        return
+    level = 95
+    riskiest = sorted(rows, key=lambda row: row.get(f'parametric_var_{level}', 0), reverse=True)[:5]
+    print(f"{time.strftime('%H:%M:%S')} {len(rows)} tickers, highest {level}% VaR per tick: " +
+          ', '.join(f"{row['symbol']} {row[f'parametric_var_{level}']:.4f}" for row in riskiest))
+
+
+def read_messages(path):
+    """
+    Recorded messages: a stream_recorder log directory, or a text file with
+    one raw message per line
+    """
+    if os.path.isdir(path):
+        from stream_recorder import read_log
+        for _, message in read_log(path):
+            yield message
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def synthetic_messages(n_messages, n_symbols=1600, seed=0):
+    """
+    Random-walk trade messages in the stream format, for load testing
+    """
+    rng = np.random.default_rng(seed)
+    symbols = [f'S{i:04d}' for i in range(n_symbols)]
+    prices = np.full(n_symbols, 20000.0)
+    picks = rng.integers(0, n_symbols, n_messages)
+    moves = np.exp(rng.normal(0, 0.002, n_messages))
+    messages = []
+    for pick, move in zip(picks, moves):
+        prices[pick] *= move
+        content = json.dumps({'RType': 'X', 'Symbol': symbols[pick], 'LastPrice': round(prices[pick], -1),
+                              'LastVol': 100})
+        messages.append(json.dumps({'DataType': 'X', 'Content': content}))
+    return messages
+
+
+def benchmark(n_messages=200000, window=500):
+    messages = synthetic_messages(n_messages)
+    service = StreamRiskService(window=window, publish_interval=1.0, publish=lambda rows: None)
+    start = time.perf_counter()
+    for message in messages:
+        service.on_message(message)
+    elapsed = time.perf_counter() - start
+    print(f"{n_messages} messages over {len(service.states)} symbols in {elapsed:.2f}s "
+          f"({n_messages / elapsed:,.0f} messages/s on one core)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Real-time VaR from the FastConnect market data stream')
+    parser.add_argument('--channel', default='X-TRADE:ALL', help='Stream channel to subscribe to')
+    parser.add_argument('--window', type=int, default=500, help='Returns kept per ticker')
+    parser.add_argument('--levels', type=float, nargs='+', default=[0.95, 0.99])
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between published snapshots')
+    parser.add_argument('--replay', help='Replay a stream_recorder log directory or a file of messages instead of the live hub')
+    parser.add_argument('--benchmark', action='store_true', help='Measure throughput on synthetic ticks and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(window=args.window)
+        return
+
+    service = StreamRiskService(args.window, args.levels, args.interval)
+    if args.replay:
+        service.replay(read_messages(args.replay))
+        print(f"Replayed {service.messages} messages ({service.skipped} skipped)")
+        return
+
+    stream = service.start(args.channel)
+    message = None
+    while message != "exit()":
+        message = input(">> ")
+        if message is not None and message != "" and message != "exit()":
+            stream.swith_channel(message)
+
+
+if __name__ == "__main__":
+    main()
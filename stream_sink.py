@@ -0,0 +1,84 @@
+import json
+import os
+
+
+class NdjsonSink(object):
+    """
+    Append-only newline-delimited JSON writer for crawl output.
+
+    Each page is written (and flushed) as soon as it arrives, so memory does
+    not grow with the history length and a crash loses at most the page in
+    flight. `sync()` fsyncs the file and is called at chunk boundaries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _truncate_torn_line(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        self.rows_written = 0
+
+    def write_page(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self.rows_written += len(rows)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _truncate_torn_line(path):
+    """
+    Cut a partially written last line left by a crash, so new rows are not
+    appended onto it
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # Walk back to the last complete line
+        position = size - 1
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            block = f.read(step)
+            index = block.rfind(b'\n')
+            if index != -1:
+                f.truncate(position - step + index + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def iter_records(path):
+    """
+    Lazily yield the records of an NDJSON file one at a time.
+    A torn last line (from a crash mid-write) is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,359 @@
+import argparse
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from itertools import product
+from string import ascii_uppercase
+
+import numpy as np
+
+MARKETS = ('HOSE', 'HNX', 'UPCOM')
+
+# Daily price limits of each exchange
+PRICE_LIMITS = {'HOSE': 0.07, 'HNX': 0.10, 'UPCOM': 0.15}
+
+# Fixed public holidays (month, day); Tet is a moving week added per year
+FIXED_HOLIDAYS = ((1, 1), (4, 30), (5, 1), (9, 2))
+
+# Index code -> (exchange, number of members or None for the whole exchange).
+# Members are the exchange's tickers in symbol order.
+INDICES = {
+    'VN30': ('HOSE', 30), 'VN100': ('HOSE', 100), 'VNINDEX': ('HOSE', None),
+    'HNX30': ('HNX', 30), 'HNXINDEX': ('HNX', None), 'HNXUPCOMINDEX': ('UPCOM', None),
+}
+
+# Continuous matching sessions, used for intraday bars
+SESSIONS = (((9, 15), (11, 30)), ((13, 0), (14, 45)))
+
+
+def synthetic_symbols(n):
+    """
+    n distinct ticker symbols: three letters (17,576 of them), then four
+    """
+    symbols = []
+    for length in (3, 4):
+        for letters in product(ascii_uppercase, repeat=length):
+            if len(symbols) == n:
+                return symbols
+            symbols.append(''.join(letters))
+    return symbols
+
+
+def trading_days(start, end, seed=0):
+    """
+    Weekdays between start and end (inclusive) without the market holidays
+    """
+    rng = np.random.default_rng(seed)
+    holidays = set()
+    for year in range(start.year, end.year + 1):
+        holidays.update(date(year, month, day) for month, day in FIXED_HOLIDAYS)
+        # Tet: about a week off somewhere between late January and mid February
+        tet = date(year, 1, 22) + timedelta(days=int(rng.integers(0, 21)))
+        holidays.update(tet + timedelta(days=i) for i in range(7))
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5 and day not in holidays:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def round_to_tick(prices):
+    ticks = np.where(prices < 10000, 10, np.where(prices < 50000, 50, 100))
+    return np.maximum(np.round(prices / ticks) * ticks, 10)
+
+
+class SyntheticMarket(object):
+    """
+    Deterministic synthetic market for the mock FastConnect server
+
+    Every ticker's history is generated from (seed, symbol), so any subset can
+    be regenerated on demand and a universe 100x the real one never has to sit
+    in memory. Histories include what the crawler and analyses have to cope
+    with: market holidays, late listings, multi-day trading halts (no rows),
+    illiquid tickers with many zero-volume days, exchange price limits and
+    dividend adjustments in ClosePriceAdjusted.
+
+    Parameters:
+    n_tickers (int): Universe size
+    start, end (date or str): Date range, 'YYYY-MM-DD'
+    seed (int): Base seed
+    illiquid_share (float): Share of tickers that often do not trade
+    late_listing_share (float): Share of tickers listed after `start`
+    halt_rate (float): Daily probability that a trading halt starts
+    cache_size (int): Ticker histories kept in memory
+    """
+
+    def __init__(self, n_tickers=112, start='2022-07-06', end='2025-07-06', seed=0,
+                 illiquid_share=0.2, late_listing_share=0.1, halt_rate=0.002, cache_size=256):
+        self.start = start if isinstance(start, date) else datetime.strptime(start, '%Y-%m-%d').date()
+        self.end = end if isinstance(end, date) else datetime.strptime(end, '%Y-%m-%d').date()
+        self.seed = seed
+        self.illiquid_share = illiquid_share
+        self.late_listing_share = late_listing_share
+        self.halt_rate = halt_rate
+        self.cache_size = cache_size
+        self.tickers = synthetic_symbols(n_tickers)
+        self.days = trading_days(self.start, self.end, seed)
+        self.ordinals = np.array([day.toordinal() for day in self.days], dtype=np.int64)
+        self.markets = {ticker: MARKETS[zlib.crc32(ticker.encode('utf-8')) % 4 % 3] for ticker in self.tickers}
+        self._known = set(self.tickers)
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rng(self, *parts):
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(part).encode('utf-8')) for part in parts])
+
+    def history(self, symbol):
+        """
+        Daily arrays of one ticker (None for unknown symbols), memoised for the
+        most recently used `cache_size` tickers
+        """
+        symbol = symbol.upper()
+        if symbol not in self._known:
+            return None
+        with self._lock:
+            history = self._histories.get(symbol)
+            if history is not None:
+                self._histories.move_to_end(symbol)
+                return history
+        # Generation is deterministic, so two threads racing here build the same arrays
+        history = self._generate(symbol)
+        with self._lock:
+            self._histories[symbol] = history
+            if len(self._histories) > self.cache_size:
+                self._histories.popitem(last=False)
+        return history
+
+    def _generate(self, symbol):
+        rng = self._rng('daily', symbol)
+        n = len(self.days)
+        market = self.markets[symbol]
+        limit = PRICE_LIMITS[market]
+
+        listed = np.ones(n, dtype=bool)
+        if rng.random() < self.late_listing_share:
+            listed[:int(rng.integers(1, max(2, 2 * n // 3)))] = False
+        halt_starts = np.flatnonzero(rng.random(n) < self.halt_rate)
+        for start in halt_starts:
+            listed[start:start + int(rng.integers(1, 21))] = False
+
+        illiquid = rng.random() < self.illiquid_share
+        zero_volume = rng.random(n) < (rng.uniform(0.2, 0.6) if illiquid else 0.005)
+
+        sigma = rng.uniform(0.01, 0.04)
+        returns = np.clip(rng.standard_t(4, n) * sigma / np.sqrt(2) + rng.normal(0.0002, 0.0002), -limit, limit)
+        returns[zero_volume] = 0.0
+        close = round_to_tick(rng.uniform(5000, 80000) * np.exp(np.cumsum(returns)))
+        reference = np.concatenate(([close[0]], close[:-1]))
+        open_ = round_to_tick(reference * np.exp(rng.normal(0, sigma / 3, n)))
+        spread = np.abs(rng.normal(0, sigma / 2, n))
+        high = np.maximum(round_to_tick(np.maximum(open_, close) * (1 + spread)), np.maximum(open_, close))
+        low = np.minimum(round_to_tick(np.minimum(open_, close) * (1 - spread)), np.minimum(open_, close))
+        ceiling = round_to_tick(reference * (1 + limit))
+        floor = round_to_tick(reference * (1 - limit))
+        high = np.minimum(high, ceiling)
+        low = np.maximum(low, floor)
+        flat = zero_volume
+        open_[flat], high[flat], low[flat] = close[flat], close[flat], close[flat]
+
+        base_volume = np.exp(rng.uniform(8, 15))
+        volume = np.round(base_volume * rng.lognormal(0, 0.7, n) / 100) * 100
+        volume[zero_volume] = 0
+        average = np.where(volume > 0, (open_ + high + low + close) / 4, close)
+
+        # Cash dividends: the adjusted history before each ex-date is scaled down
+        adjustment = np.ones(n)
+        for ex_day in rng.integers(1, n, rng.integers(0, 4)):
+            adjustment[:ex_day] *= 1 - rng.uniform(0.02, 0.08)
+
+        keep = listed
+        return {
+            'market': market,
+            'ordinal': self.ordinals[keep],
+            'open': open_[keep], 'high': high[keep], 'low': low[keep], 'close': close[keep],
+            'reference': reference[keep], 'average': np.round(average[keep]),
+            'ceiling': ceiling[keep], 'floor': floor[keep],
+            'adjusted': (close * adjustment)[keep],
+            'volume': volume[keep].astype(np.int64),
+        }
+
+    def _slice(self, symbol, from_date, to_date):
+        history = self.history(symbol)
+        if history is None:
+            return None, 0, 0
+        ordinals = history['ordinal']
+        lo = np.searchsorted(ordinals, from_date.toordinal(), side='left')
+        hi = np.searchsorted(ordinals, to_date.toordinal(), side='right')
+        return history, lo, hi
+
+    def daily_stock_price(self, symbol, from_date, to_date):
+        """
+        DailyStockPrice rows between the dates, newest first like the live API
+        """
+        history, lo, hi = self._slice(symbol, from_date, to_date)
+        rows = []
+        for i in range(hi - 1, lo - 1, -1):
+            close, reference, volume = history['close'][i], history['reference'][i], int(history['volume'][i])
+            change = close - reference
+            value = int(volume * history['average'][i])
+            foreign_buy = int(volume * 0.05)
+            foreign_sell = int(volume * 0.04)
+            rows.append({
+                'TradingDate': date.fromordinal(int(history['ordinal'][i])).strftime('%d/%m/%Y'),
+                'PriceChange': f'{change:.0f}',
+                'PerPriceChange': f'{change / reference * 100:.2f}',
+                'CeilingPrice': f"{history['ceiling'][i]:.0f}",
+                'FloorPrice': f"{history['floor'][i]:.0f}",
+                'RefPrice': f'{reference:.0f}',
+                'OpenPrice': f"{history['open'][i]:.0f}",
+                'HighestPrice': f"{history['high'][i]:.0f}",
+                'LowestPrice': f"{history['low'][i]:.0f}",
+                'ClosePrice': f'{close:.0f}',
+                'AveragePrice': f"{history['average'][i]:.0f}",
+                'ClosePriceAdjusted': f"{history['adjusted'][i]:.6f}",
+                'TotalMatchVol': str(volume),
+                'TotalMatchVal': str(value),
+                'TotalDealVal': '0',
+                'TotalDealVol': '0',
+                'ForeignBuyVolTotal': str(foreign_buy),
+                'ForeignCurrentRoom': '0',
+                'ForeignSellVolTotal': str(foreign_sell),
+                'ForeignBuyValTotal': str(int(foreign_buy * close)),
+                'ForeignSellValTotal': str(int(foreign_sell * close)),
+                'TotalBuyTrade': '0',
+                'TotalBuyTradeVol': '0',
+                'TotalSellTrade': '0',
+                'TotalSellTradeVol': '0',
+                'NetBuySellVol': str(foreign_buy - foreign_sell),
+                'NetBuySellVal': str(int((foreign_buy - foreign_sell) * close)),
+                'TotalTradedVol': str(volume),
+                'TotalTradedValue': str(value),
+                'Symbol': symbol.upper(),
+                'Time': None,
+            })
+        return rows
+
+    def daily_ohlc(self, symbol, from_date, to_date):
+        """
+        DailyOhlc rows between the dates, oldest first
+        """
+        history, lo, hi = self._slice(symbol, from_date, to_date)
+        rows = []
+        for i in range(lo, hi):
+            volume = int(history['volume'][i])
+            rows.append({
+                'Symbol': symbol.upper(),
+                'Market': history['market'],
+                'TradingDate': date.fromordinal(int(history['ordinal'][i])).strftime('%d/%m/%Y'),
+                'Time': None,
+                'Open': f"{history['open'][i]:.0f}",
+                'High': f"{history['high'][i]:.0f}",
+                'Low': f"{history['low'][i]:.0f}",
+                'Close': f"{history['close'][i]:.0f}",
+                'Volume': str(volume),
+                'Value': str(int(volume * history['average'][i])),
+            })
+        return rows
+
+    def intraday_ohlc(self, symbol, from_date, to_date):
+        """
+        One-minute IntradayOhlc bars between the dates, oldest first. Each day's
+        bars run from its open to its close inside the day's low/high, and the
+        day's volume is split across them; zero-volume days have no bars.
+        """
+        history, lo, hi = self._slice(symbol, from_date, to_date)
+        minutes = [minute for start, end in SESSIONS
+                   for minute in range(start[0] * 60 + start[1], end[0] * 60 + end[1])]
+        rows = []
+        for i in range(lo, hi):
+            volume = int(history['volume'][i])
+            if volume == 0:
+                continue
+            day = date.fromordinal(int(history['ordinal'][i]))
+            rng = self._rng('intraday', symbol, day.toordinal())
+            n = len(minutes)
+            walk = np.cumsum(rng.normal(0, 1, n))
+            # Brownian bridge from open to close
+            bridge = walk - np.linspace(0, 1, n) * walk[-1]
+            scale = (history['high'][i] - history['low'][i]) / max(np.ptp(bridge), 1e-9) / 2
+            path = np.linspace(history['open'][i], history['close'][i], n) + bridge * scale
+            path = np.clip(round_to_tick(path), history['low'][i], history['high'][i])
+            shares = np.round(rng.dirichlet(np.full(n, 0.5)) * volume / 100) * 100
+            trading_date = day.strftime('%d/%m/%Y')
+            previous = history['open'][i]
+            for minute, price, vol in zip(minutes, path, shares):
+                if vol == 0:
+                    continue
+                rows.append({
+                    'Symbol': symbol.upper(),
+                    'TradingDate': trading_date,
+                    'Time': f'{minute // 60:02d}:{minute % 60:02d}:00',
+                    'Open': f'{previous:.0f}',
+                    'High': f'{max(previous, price):.0f}',
+                    'Low': f'{min(previous, price):.0f}',
+                    'Close': f'{price:.0f}',
+                    'Volume': str(int(vol)),
+                    'Value': str(int(vol * price)),
+                })
+                previous = price
+        return rows
+
+    def securities(self, market=''):
+        market = (market or '').upper()
+        return [{'Market': self.markets[ticker], 'Symbol': ticker,
+                 'StockName': f'CTCP {ticker}', 'StockEnName': f'{ticker} Joint Stock Company'}
+                for ticker in self.tickers if not market or self.markets[ticker] == market]
+
+    def index_components(self, index_code):
+        """
+        IndexComponents rows for an index in INDICES: one row per index with
+        its members in `IndexComponent`, as the live API returns them
+        """
+        code = (index_code or '').upper()
+        if code not in INDICES:
+            return []
+        exchange, size = INDICES[code]
+        members = [ticker for ticker in self.tickers if self.markets[ticker] == exchange][:size]
+        return [{'IndexCode': code, 'IndexName': code, 'Exchange': exchange, 'TotalSymbolNo': len(members),
+                 'IndexComponent': [{'Isin': f'VN000000{ticker}', 'StockSymbol': ticker} for ticker in members]}]
+
+
+def write_results(market, results_dir, indent=4):
+    """
+    Write the whole universe as results/stock_price_{ticker}.json files, the
+    layout crawl.py produces
+
+    Returns:
+    int: Number of rows written
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    total = 0
+    for ticker in market.tickers:
+        rows = market.daily_stock_price(ticker, market.start, market.end)
+        with open(os.path.join(results_dir, f'stock_price_{ticker}.json'), 'w') as f:
+            json.dump(rows[::-1], f, indent=indent)
+        total += len(rows)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic universe in the crawl output layout')
+    parser.add_argument('--tickers', type=int, default=112)
+    parser.add_argument('--start', default='2022-07-06')
+    parser.add_argument('--end', default='2025-07-06')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='synthetic_results')
+    args = parser.parse_args()
+
+    market = SyntheticMarket(args.tickers, args.start, args.end, args.seed)
+    write_results(market, args.output_dir)
+    print(f"Wrote {args.tickers} synthetic tickers to {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import json
-from ssi_fc_data import fc_md_client, model
+from ssi_fc_data import model
 import config
 from datetime import datetime, timedelta
 import time
 from constants import tickers
+from response_cache import CachingMarketDataClient
 
-client = fc_md_client.MarketDataClient(config)
+# Historical responses are served from .response_cache after the first run
+client = CachingMarketDataClient(config)
 
 def save_to_json_file(filename, data):
     with open(filename, 'w') as f:
@@ -0,0 +1,187 @@
+import argparse
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ssi_fc_data import model
+
+import config
+from constants import requests_per_second, request_burst
+from rate_limiter import TokenBucket
+
+universe_file = '.universe.json'
+
+MARKETS = ('HOSE', 'HNX', 'UPCOM')
+
+# Rows asked for per Securities / IndexComponents page
+universe_page_size = 1000
+
+# Listed shares have three-character codes; covered warrants, bonds and most
+# ETFs on the same listings are longer
+EQUITY_PATTERN = re.compile(r'^[A-Z0-9]{3}$')
+
+
+def index_codes(path='index_list.json'):
+    """
+    Index codes from a saved IndexList response (see test_Req_Res.md_get_index_list)
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [row['IndexCode'] for row in json.load(f).get('data') or []]
+
+
+def request_listing(client, limiter, kind, key, page_index, page_size=None):
+    """
+    One page of the Securities listing of a market (kind 'market') or of an
+    index's components (kind 'index')
+    """
+    if limiter is not None:
+        limiter.acquire()
+    page_size = page_size or universe_page_size
+    if kind == 'market':
+        data = client.securities(config, model.securities(key, page_index, page_size))
+    else:
+        data = client.index_components(config, model.index_components(key, page_index, page_size))
+    status = str(data.get('status', 'success')).lower()
+    if status not in ('success', '200'):
+        raise RuntimeError(f"API error for {kind} {key} page {page_index}: {data.get('message')}")
+    return data
+
+
+def page_symbols(kind, rows):
+    """
+    Symbols in one page. Securities rows carry `Symbol`; IndexComponents rows
+    are one per index with the members under `IndexComponent`.
+    """
+    symbols = []
+    for row in rows or []:
+        if kind == 'market':
+            symbols.append(row.get('Symbol'))
+        else:
+            for component in row.get('IndexComponent') or [row]:
+                symbols.append(component.get('StockSymbol'))
+    return [symbol.strip().upper() for symbol in symbols if symbol]
+
+
+def fetch_listings(client, sources, limiter=None, workers=8, page_size=None):
+    """
+    Every symbol of every (kind, key) source. First pages are requested
+    concurrently; their totalRecord says how many pages each source has, and
+    the remaining pages then go out concurrently as well. A source whose
+    response has no totalRecord is paged one by one until a short page.
+
+    Returns:
+    dict: (kind, key) -> list of symbols
+    """
+    page_size = page_size or universe_page_size
+    symbols = {source: [] for source in sources}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        first = {source: executor.submit(request_listing, client, limiter, *source, 1, page_size) for source in sources}
+        rest = {}
+        unknown_total = []
+        for source, future in first.items():
+            data = future.result()
+            page = page_symbols(source[0], data.get('data'))
+            symbols[source].extend(page)
+            total = data.get('totalRecord')
+            if total is None:
+                if len(page) >= page_size:
+                    unknown_total.append(source)
+                continue
+            for page_index in range(2, math.ceil(int(total) / page_size) + 1):
+                rest[executor.submit(request_listing, client, limiter, *source, page_index, page_size)] = source
+        for future, source in rest.items():
+            symbols[source].extend(page_symbols(source[0], future.result().get('data')))
+
+    for source in unknown_total:
+        page_index = 2
+        while True:
+            page = page_symbols(source[0], request_listing(client, limiter, *source, page_index, page_size).get('data'))
+            symbols[source].extend(page)
+            if len(page) < page_size:
+                break
+            page_index += 1
+    return symbols
+
+
+def build_universe(client, limiter=None, markets=MARKETS, indices=None, equity_only=True, workers=8):
+    """
+    Build the tradable universe from the Securities listings of `markets` and
+    the components of `indices` (default: the codes in index_list.json).
+    Pass the crawler's limiter so the listing requests count against the same quota.
+
+    Returns:
+    dict: 'markets' and 'indices' (code -> symbols), and 'symbols', the
+        de-duplicated, sorted union
+    """
+    indices = index_codes() if indices is None else indices
+    sources = [('market', market) for market in markets] + [('index', code) for code in indices]
+    listings = fetch_listings(client, sources, limiter, workers)
+
+    def keep(symbols):
+        return sorted({symbol for symbol in symbols if not equity_only or EQUITY_PATTERN.match(symbol)})
+
+    universe = {
+        'built': time.time(),
+        'url': client._config.url,
+        'markets': {key: keep(listings[(kind, key)]) for kind, key in sources if kind == 'market'},
+        'indices': {key: keep(listings[(kind, key)]) for kind, key in sources if kind == 'index'},
+    }
+    universe['symbols'] = sorted(set().union(*universe['markets'].values(), *universe['indices'].values()))
+    return universe
+
+
+def save_universe(universe, path=None):
+    path = path or universe_file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(universe, f)
+    os.replace(tmp, path)
+
+
+def load_universe(client, limiter=None, path=None, ttl=24 * 3600, refresh=False, **kwargs):
+    """
+    The cached universe if it is younger than `ttl` seconds and was built
+    against the current API url, otherwise a freshly built (and saved) one.
+    `kwargs` go to build_universe.
+    """
+    path = path or universe_file
+    if not refresh and os.path.exists(path):
+        with open(path, 'r') as f:
+            universe = json.load(f)
+        if time.time() - universe['built'] < ttl and universe.get('url') == client._config.url:
+            return universe
+    universe = build_universe(client, limiter, **kwargs)
+    save_universe(universe, path)
+    return universe
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the symbol universe from the Securities and IndexComponents listings')
+    parser.add_argument('--url', default=None, help='Override config.url, e.g. a local mock_fc_server.py instance')
+    parser.add_argument('--output', default=universe_file)
+    parser.add_argument('--ttl', type=float, default=24 * 3600, help='Seconds a cached universe stays fresh')
+    parser.add_argument('--refresh', action='store_true', help='Rebuild even if the cache is fresh')
+    parser.add_argument('--all-securities', action='store_true', help='Keep warrants, bonds and ETFs as well as shares')
+    parser.add_argument('--rate', type=float, default=requests_per_second)
+    parser.add_argument('--burst', type=float, default=request_burst)
+    args = parser.parse_args()
+
+    from crawl import init_client
+    client = init_client(args.url)
+    start = time.time()
+    universe = load_universe(client, TokenBucket(args.rate, args.burst), args.output, args.ttl, args.refresh,
+                             equity_only=not args.all_securities)
+    for market, symbols in universe['markets'].items():
+        print(f"{market}: {len(symbols)} symbols")
+    for index, symbols in universe['indices'].items():
+        print(f"{index}: {len(symbols)} components")
+    print(f"Universe: {len(universe['symbols'])} symbols ({time.time() - start:.1f}s) in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
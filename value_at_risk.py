@@ -1,10 +1,8 @@
+import argparse
 import numpy as np
 from scipy import stats
-import pandas as pd
-import json
-import os
-
-import matplotlib.pyplot as plt
+import price_store
+from render_plots import PlotJob, render_plots
 
 def calculate_log_returns(stock_data):
     """
@@ -73,68 +71,74 @@ def calculate_monthly_var(daily_returns, confidence_level=0.95, initial_investme
     
     return monthly_var
 
-def plot_var_distribution(returns, confidence_level=0.95, initial_investment=1000000, filename='var_distribution.png'):
+def draw_var_distribution(fig, returns, confidence_level=0.95, initial_investment=1000000):
     """
-    Plot a histogram of returns and save VaR plot to file
-    
-    Parameters:
-    returns (array-like): Array of historical returns
-    confidence_level (float): Confidence level for VaR calculation (default: 0.95)
-    initial_investment (float): Initial investment amount (default: 1000000)
-    filename (str): Output filename for the plot (default: 'var_distribution.png')
+    Draw a histogram of returns and the VaR level onto `fig`
     """
     # Calculate VaR
     var = calculate_var(returns, confidence_level, initial_investment)
-    
-    # Create the plot
-    plt.figure(figsize=(10, 6))
-    
+    ax = fig.add_subplot()
+
     # Plot histogram of returns
-    plt.hist(returns, bins=50, alpha=0.7, color='blue')
-    
+    ax.hist(returns, bins=50, alpha=0.7, color='blue')
+
     # Add VaR line
     var_percentile = np.percentile(returns, (1 - confidence_level) * 100)
-    plt.axvline(x=var_percentile, color='red', linestyle='--')
-    
+    ax.axvline(x=var_percentile, color='red', linestyle='--')
+
     # Add labels and title
-    plt.title(f'Return Distribution and VaR at {confidence_level*100}% Confidence Level')
-    plt.xlabel('Returns')
-    plt.ylabel('Count')
-    
+    ax.set_title(f'Return Distribution and VaR at {confidence_level*100}% Confidence Level')
+    ax.set_xlabel('Returns')
+    ax.set_ylabel('Count')
+
     # Add VaR annotation
-    plt.text(var_percentile, plt.ylim()[1]*0.9, 
-             f'VaR: ${var:,.2f}',
-             rotation=90,
-             verticalalignment='top')
-    
-    plt.grid(True, alpha=0.3)
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
-    plt.close()
+    ax.text(var_percentile, ax.get_ylim()[1]*0.9,
+            f'VaR: ${var:,.2f}',
+            rotation=90,
+            verticalalignment='top')
 
-if __name__ == "__main__":
-    # Get all JSON files in the results folder
-    json_files = [f for f in os.listdir('results') if f.endswith('.json')]
+    ax.grid(True, alpha=0.3)
 
-    for json_file in json_files:
-        stock_code = json_file.replace('stock_price_', '').replace('.json', '')
-        print(f"\nProcessing {stock_code}...")
 
-        # Read the JSON file
-        with open(os.path.join('results', json_file), 'r') as file:
-            data = json.load(file)
+def plot_var_distribution(returns, confidence_level=0.95, initial_investment=1000000, filename='var_distribution.png'):
+    """
+    Plot a histogram of returns and save VaR plot to file
+    
+    Parameters:
+    returns (array-like): Array of historical returns
+    confidence_level (float): Confidence level for VaR calculation (default: 0.95)
+    initial_investment (float): Initial investment amount (default: 1000000)
+    filename (str): Output filename for the plot (default: 'var_distribution.png')
+    """
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(10, 6))
+    draw_var_distribution(fig, returns, confidence_level, initial_investment)
+    fig.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close(fig)
 
-        # Convert to DataFrame
-        stock_price_df = pd.DataFrame(data)
-        print(f"Total records fetched for {stock_code}: {len(stock_price_df)}")
 
-        # Convert TradingDate to datetime
-        stock_price_df['TradingDate'] = pd.to_datetime(stock_price_df['TradingDate'], format='%d/%m/%Y')
+def var_distribution_job(returns, confidence_level=0.95, initial_investment=1000000, filename='var_distribution.png'):
+    """
+    plot_var_distribution as a PlotJob for render_plots, redrawn only when the returns change
+    """
+    return PlotJob(filename, draw_var_distribution,
+                   (np.asarray(returns, dtype=np.float64), confidence_level, initial_investment),
+                   figsize=(10, 6), dpi=300)
 
-        # Convert ClosePriceAdjusted to float
-        stock_price_df['ClosePriceAdjusted'] = stock_price_df['ClosePriceAdjusted'].astype(float)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Monthly parametric VaR and return distribution plots per ticker')
+    parser.add_argument('--workers', type=int, default=None, help='Render processes (default: one per core)')
+    parser.add_argument('--force', action='store_true', help='Redraw every chart, even unchanged ones')
+    args = parser.parse_args()
+
+    # Every ticker in the columnar price store
+    jobs = []
+    for stock_code in price_store.list_tickers():
+        print(f"\nProcessing {stock_code}...")
 
-        # Sort by date
-        stock_price_df = stock_price_df.sort_values('TradingDate')
+        # Load typed, date-sorted prices (only the column we need)
+        stock_price_df = price_store.load_ticker(stock_code, ['ClosePriceAdjusted'])
+        print(f"Total records fetched for {stock_code}: {len(stock_price_df)}")
 
         # Calculate log returns
         log_returns = calculate_log_returns(stock_price_df)
@@ -143,8 +147,12 @@ if __name__ == "__main__":
         monthly_var = calculate_monthly_var(log_returns, confidence_level=0.95, initial_investment=1000000)
         print(f"{stock_code} Monthly Value at Risk: ${monthly_var:,.2f}")
 
-        # Plot and save the VaR distribution
-        plot_var_distribution(log_returns, confidence_level=0.95, initial_investment=1000000, 
-                            filename=f'{stock_code.lower()}_var_distribution.png')
-        
-   
\ No newline at end of file
+        # Queue the VaR distribution plot; they are rendered together below
+        jobs.append(var_distribution_job(log_returns, confidence_level=0.95, initial_investment=1000000,
+                                         filename=f'{stock_code.lower()}_var_distribution.png'))
+
+    summary = render_plots(jobs, workers=args.workers, force=args.force)
+    for output, error in summary['failed'].items():
+        print(f"Error plotting {output}: {error}")
+    print(f"\nPlotted {len(summary['rendered'])} VaR distributions, {summary['skipped']} unchanged "
+          f"({summary['seconds']:.2f}s)")
@@ -0,0 +1,125 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def build_returns_panel(returns_by_ticker):
+    """
+    Align every ticker's returns on one date index
+
+    Parameters:
+    returns_by_ticker (dict): Ticker -> Series of returns indexed by date
+
+    Returns:
+    tuple: (dates, tickers, panel) where panel is a dates x tickers float array
+           with NaN wherever a ticker has no return for a date
+    """
+    frame = pd.concat(returns_by_ticker, axis=1, sort=True)
+    return frame.index.to_numpy(), list(frame.columns), frame.to_numpy(dtype=np.float64)
+
+
+def load_monthly_returns_panel(returns_dir='monthly_returns'):
+    """
+    Read every monthly_returns_*.csv into one aligned returns panel
+    """
+    returns_by_ticker = {}
+    for file_path in sorted(Path(returns_dir).glob('monthly_returns_*.csv')):
+        stock_code = file_path.stem.split('_')[-1]
+        returns = pd.read_csv(file_path, index_col=0, parse_dates=True)
+        returns_by_ticker[stock_code] = returns['log_return']
+    return build_returns_panel(returns_by_ticker)
+
+
+def load_daily_returns_panel(tickers=None):
+    """
+    Daily log returns of ClosePriceAdjusted for every ticker in the price store,
+    aligned into one panel. Like value_at_risk.calculate_log_returns, days with
+    a zero adjusted price are dropped before taking returns.
+    """
+    import price_store
+
+    returns_by_ticker = {}
+    for stock_code in tickers or price_store.list_tickers():
+        df = price_store.load_ticker(stock_code, ['ClosePriceAdjusted'])
+        df = df[df['ClosePriceAdjusted'] != 0]
+        closes = df.set_index('TradingDate')['ClosePriceAdjusted']
+        returns_by_ticker[stock_code] = np.log(closes / closes.shift(1)).dropna()
+    return build_returns_panel(returns_by_ticker)
+
+
+def nan_percentile(panel, percentiles):
+    """
+    Column-wise percentiles ignoring NaNs, with numpy's default linear
+    interpolation. Sorting once pushes NaNs to the bottom of every column,
+    which is much faster than np.nanpercentile's per-column fallback.
+
+    Returns:
+    ndarray: len(percentiles) x columns
+    """
+    ordered = np.sort(panel, axis=0)
+    counts = np.sum(~np.isnan(panel), axis=0)
+    positions = np.asarray(percentiles, dtype=np.float64)[:, None] / 100 * (counts - 1)[None, :]
+    positions = np.clip(positions, 0, None)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0)[None, :])
+    weight = positions - lower
+    low_values = np.take_along_axis(ordered, lower, axis=0)
+    high_values = np.take_along_axis(ordered, upper, axis=0)
+    result = low_values + (high_values - low_values) * weight
+    # Columns without a single observation have no percentile
+    result[:, counts == 0] = np.nan
+    return result
+
+
+def panel_var(panel, confidence_levels=(0.95, 0.99)):
+    """
+    Parametric (Normal) and historical VaR for every column of a returns panel
+    in one vectorised call. Matches calculate_var.calculate_var column by column
+    (sample std with ddof=1, linear percentile interpolation), ignoring NaNs.
+
+    Parameters:
+    panel (ndarray): dates x tickers returns, NaN where missing
+    confidence_levels (list): Confidence levels, e.g. [0.95, 0.99]
+
+    Returns:
+    dict: 'parametric_var_<level>' / 'historical_var_<level>' -> array with one value per ticker
+    """
+    panel = np.asarray(panel, dtype=np.float64)
+    levels = np.asarray(confidence_levels, dtype=np.float64)
+
+    mean = np.nanmean(panel, axis=0)
+    std = np.nanstd(panel, axis=0, ddof=1)
+
+    # levels x tickers
+    z_scores = stats.norm.ppf(1 - levels)[:, None]
+    parametric = -(mean[None, :] + z_scores * std[None, :])
+    historical = -nan_percentile(panel, (1 - levels) * 100)
+
+    results = {}
+    for i, conf_level in enumerate(levels):
+        results[f'parametric_var_{int(conf_level*100)}'] = parametric[i]
+        results[f'historical_var_{int(conf_level*100)}'] = historical[i]
+    return results
+
+
+def panel_var_frame(tickers, panel, confidence_levels=(0.95, 0.99)):
+    """
+    panel_var laid out like var_results/var_results.csv (one row per stock)
+    """
+    var_df = pd.DataFrame(panel_var(panel, confidence_levels))
+    var_df['stock_code'] = tickers
+    return var_df
+
+
+if __name__ == "__main__":
+    # Time the vectorised engine on a synthetic universe of increasing size
+    rng = np.random.default_rng(0)
+    for n_tickers in (112, 1000, 5000):
+        panel = rng.normal(0, 0.1, size=(36, n_tickers))
+        panel[rng.random(panel.shape) < 0.05] = np.nan
+        start = time.perf_counter()
+        panel_var(panel, [0.9, 0.95, 0.99])
+        print(f"{n_tickers} tickers x 36 months: {(time.perf_counter() - start) * 1000:.1f} ms")